@@ -0,0 +1,85 @@
+"""
+    Micro-benchmarks comparing the byte stuffing codec with the original
+    per-byte implementation it replaced.
+    python3 benchmarks/bench_byte_stuffing.py
+"""
+
+import random
+
+import harness
+from sensirion_sps030 import byte_stuffing # pylint: disable=wrong-import-order
+
+
+def legacy_stuff(data):
+    """
+        The original Sensirion._stuff_bytes without the logging
+    """
+    data_stuffed = b''
+    for i in data:
+        if bytes([i]) == b'\x7E':
+            data_stuffed += b'\x7D' + b'\x5E'
+        elif bytes([i]) == b'\x7D':
+            data_stuffed += b'\x7D' + b'\x5D'
+        elif bytes([i]) == b'\x11':
+            data_stuffed += b'\x7D' + b'\x31'
+        elif bytes([i]) == b'\x13':
+            data_stuffed += b'\x7D' + b'\x33'
+        else:
+            data_stuffed += bytes([i])
+    return data_stuffed
+
+
+def legacy_unstuff(data):
+    """
+        The original Sensirion._unstuff_bytes without the logging
+    """
+    data_unstuffed = b''
+    i = 0
+    while i < len(data):
+        if bytes([data[i]]) == b'\x7d':
+            if bytes([data[i + 1]]) == b'\x5e':
+                data_unstuffed += b'\x7e'
+            elif bytes([data[i + 1]]) == b'\x5d':
+                data_unstuffed += b'\x7d'
+            elif bytes([data[i + 1]]) == b'\x31':
+                data_unstuffed += b'\x11'
+            elif bytes([data[i + 1]]) == b'\x33':
+                data_unstuffed += b'\x13'
+            i += 2
+        else:
+            data_unstuffed += bytes([data[i]])
+            i += 1
+    return data_unstuffed
+
+
+def check_round_trip(samples=2000, seed=0):
+    """
+        Sanity check both implementations agree before timing them
+    """
+    rand = random.Random(seed)
+    for _ in range(samples):
+        data = bytes(rand.choice(b'\x7e\x7d\x11\x13\x00\xff') if rand.random() < 0.3
+                     else rand.randrange(256) for _ in range(rand.randrange(64)))
+        stuffed = byte_stuffing.stuff(data)
+        if (stuffed != legacy_stuff(data) or byte_stuffing.unstuff(stuffed) != data or
+                byte_stuffing.unstuff(memoryview(bytearray(stuffed))) != data):
+            raise RuntimeError("Byte stuffing round trip failed for %s" % data.hex())
+
+
+def benchmarks():
+    """
+        Stuffing and unstuffing of a measurement sized payload
+    """
+    check_round_trip()
+    rand = random.Random(1)
+    payload = bytes(rand.randrange(256) for _ in range(40)) + b'\x7e\x11\x13\x7d'
+    stuffed = byte_stuffing.stuff(payload)
+    return {
+        "stuff": (lambda: byte_stuffing.stuff(payload), 2000),
+        "stuff_legacy": (lambda: legacy_stuff(payload), 2000),
+        "unstuff": (lambda: byte_stuffing.unstuff(stuffed), 2000),
+        "unstuff_legacy": (lambda: legacy_unstuff(stuffed), 2000),
+    }
+
+if __name__ == "__main__":
+    harness.report(harness.run(benchmarks()))
@@ -0,0 +1,54 @@
+"""
+    Benchmarks for checksums, frame parsing, decoding and full read cycles
+    against the emulated sensor.
+    python3 benchmarks/bench_protocol.py
+"""
+
+import harness
+from sensirion_sps030 import shdlc # pylint: disable=wrong-import-order
+from sensirion_sps030.byte_stuffing import unstuff
+from sensirion_sps030.emulator import LoopbackSerial, SPS30Emulator
+from sensirion_sps030.sensirion_sps030 import (
+    CMD_READ_MEASUREMENT, Sensirion, SensirionReading)
+from sensirion_sps030.sensirion_error_codes import ERROR_CODE_NO_ERROR
+
+
+def _measurement_frame():
+    """
+        A stuffed read measurement response as the sensor would send it
+    """
+    emulator = SPS30Emulator(seed=1)
+    emulator.measuring = True
+    return emulator.response(
+        CMD_READ_MEASUREMENT[0], ERROR_CODE_NO_ERROR,
+        emulator.handlers[CMD_READ_MEASUREMENT[0]](b'')[1])
+
+
+def benchmarks():
+    """
+        Protocol level benchmarks
+    """
+    frame = _measurement_frame()
+    unstuffed = unstuff(frame)
+    stream = (b'\x00\x13garbage' + frame) * 100
+
+    def parse_stream():
+        reader = shdlc.FrameReader()
+        reader.feed(stream)
+        while reader.next_frame() is not None:
+            pass
+
+    sensor = Sensirion(serial=LoopbackSerial(seed=1))
+    return {
+        "calculate_checksum": (
+            lambda: shdlc.calculate_checksum(unstuffed[1:5], unstuffed[5:-2]), 5000),
+        "verify_checksum": (lambda: shdlc.verify_checksum(unstuffed), 5000),
+        "reading_construction": (lambda: SensirionReading(unstuffed), 5000),
+        "reading_decode": (lambda: SensirionReading(unstuffed).pm25, 5000),
+        "frame_reader_100_frames": (parse_stream, 100),
+        "read_cycle_loopback": (sensor._read_with_retries, 20), # pylint: disable=protected-access
+        "read_raw_cycle_loopback": (sensor._read_frame_with_retries, 20), # pylint: disable=protected-access
+    }
+
+if __name__ == "__main__":
+    harness.report(harness.run(benchmarks()))
@@ -0,0 +1,56 @@
+"""
+    Minimal benchmark harness producing machine-readable results
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+def measure(func, number, repeat=5):
+    """
+        Time func, returning seconds per call for the best and median run
+    """
+    runs = [elapsed / number for elapsed in timeit.repeat(func, number=number, repeat=repeat)]
+    return {
+        "best": min(runs),
+        "median": statistics.median(runs),
+        "calls_per_second": 1 / min(runs),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(benchmarks, repeat=5):
+    """
+        Run a dict of name -> (func, number) and return the results
+    """
+    return {
+        name: measure(func, number, repeat)
+        for name, (func, number) in sorted(benchmarks.items())}
+
+
+def report(results, output=None):
+    """
+        Write results with enough context to compare between releases
+    """
+    document = {
+        "created": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if output is None:
+        print(text)
+    else:
+        with open(output, "w") as out:
+            out.write(text + "\n")
+    return document
@@ -0,0 +1,53 @@
+"""
+    Run every benchmark and write the results as JSON
+    python3 benchmarks/run_benchmarks.py -o results.json
+    python3 benchmarks/run_benchmarks.py --compare baseline.json
+"""
+
+import json
+import sys
+from argparse import ArgumentParser
+
+import harness
+import bench_byte_stuffing
+import bench_protocol
+
+SUITES = {
+    "byte_stuffing": bench_byte_stuffing,
+    "protocol": bench_protocol,
+}
+
+
+def compare(results, baseline, threshold):
+    """
+        List the benchmarks that got slower than threshold times the baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is not None and result["best"] > old["best"] * threshold:
+            regressions.append((name, old["best"], result["best"]))
+    return regressions
+
+if __name__ == "__main__":
+    ARG_PARSER = ArgumentParser(description="Run the sensirion_sps030 benchmarks")
+    ARG_PARSER.add_argument("-o", "--output", help="File to write the JSON results to")
+    ARG_PARSER.add_argument("--compare", help="Earlier results to check for regressions")
+    ARG_PARSER.add_argument(
+        "--threshold", type=float, default=1.2,
+        help="Slowdown factor counted as a regression")
+    ARG_PARSER.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    ARG_PARSER.add_argument("suites", nargs="*", help="Suites to run (default all)")
+    ARGS = ARG_PARSER.parse_args()
+    RESULTS = {}
+    for suite in ARGS.suites or sorted(SUITES):
+        for bench, result in harness.run(SUITES[suite].benchmarks(), ARGS.repeat).items():
+            RESULTS["%s.%s" % (suite, bench)] = result
+    harness.report(RESULTS, ARGS.output)
+    if ARGS.compare:
+        with open(ARGS.compare) as baseline_file:
+            BASELINE = json.load(baseline_file)["results"]
+        REGRESSIONS = compare(RESULTS, BASELINE, ARGS.threshold)
+        for name, old, new in REGRESSIONS:
+            print("REGRESSION %s: %.3gs -> %.3gs per call" % (name, old, new), file=sys.stderr)
+        sys.exit(1 if REGRESSIONS else 0)
@@ -1 +1,8 @@
 from .sensirion_sps030 import SensirionReading, Sensirion, SensirionException
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionDeviceException, SensirionFrameException,
+    SensirionNoDataException, SensirionTimeoutException)
+from .pool import SensorPool
+from .async_sensirion import AsyncSensirion
+from .supervisor import SupervisedSensirion
+from .i2c import SensirionI2C
@@ -0,0 +1,201 @@
+"""
+    Incremental statistics over streams of readings
+    Every update is O(1) and memory doesn't grow with the window length:
+    percentiles are estimated with the P-square algorithm (Jain & Chlamtac,
+    1985) which keeps five markers per percentile instead of the samples.
+    Windows are tumbling rather than sliding: P-square estimates can't drop
+    old samples or be merged, so a sliding window would have to keep them.
+"""
+
+import math
+
+from .sensirion_sps030 import MEASUREMENT_FIELDS
+
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class P2Quantile(object):
+    """
+        Streaming estimate of a single quantile
+    """
+    __slots__ = ("quantile", "heights", "positions", "desired", "increments")
+
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        """
+            Update the estimate with a new sample
+        """
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        positions = self.positions
+        for index in range(cell + 1, 5):
+            positions[index] += 1
+        for index in range(5):
+            self.desired[index] += self.increments[index]
+        for index in range(1, 4):
+            delta = self.desired[index] - positions[index]
+            if ((delta >= 1 and positions[index + 1] - positions[index] > 1) or
+                    (delta <= -1 and positions[index - 1] - positions[index] < -1)):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(index, step)
+                if not heights[index - 1] < height < heights[index + 1]:
+                    height = self._linear(index, step)
+                heights[index] = height
+                positions[index] += step
+
+    def _parabolic(self, index, step):
+        """
+            Piecewise-parabolic prediction of a marker height
+        """
+        heights, positions = self.heights, self.positions
+        return heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+            (positions[index] - positions[index - 1] + step) *
+            (heights[index + 1] - heights[index]) /
+            (positions[index + 1] - positions[index]) +
+            (positions[index + 1] - positions[index] - step) *
+            (heights[index] - heights[index - 1]) /
+            (positions[index] - positions[index - 1]))
+
+    def _linear(self, index, step):
+        """
+            Linear prediction used when the parabola overshoots
+        """
+        heights, positions = self.heights, self.positions
+        return heights[index] + step * (
+            (heights[index + step] - heights[index]) /
+            (positions[index + step] - positions[index]))
+
+    def value(self):
+        """
+            Current estimate, exact while fewer than five samples were seen
+        """
+        heights = self.heights
+        if not heights:
+            return math.nan
+        if len(heights) < 5:
+            rank = self.quantile * (len(heights) - 1)
+            lower = int(rank)
+            upper = min(lower + 1, len(heights) - 1)
+            return heights[lower] + (heights[upper] - heights[lower]) * (rank - lower)
+        return heights[2]
+
+
+class ChannelStats(object):
+    """
+        Count, mean, min, max and percentiles of one measurement channel
+    """
+    __slots__ = ("count", "mean", "min", "max", "quantiles")
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.quantiles = [P2Quantile(percentile) for percentile in percentiles]
+
+    def add(self, value):
+        """
+            Update the statistics with a new sample
+        """
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+    def summary(self):
+        """
+            The statistics as a dict, percentiles are named p50, p90, ...
+        """
+        summary = {"count": self.count, "mean": self.mean if self.count else math.nan,
+                   "min": self.min if self.count else math.nan,
+                   "max": self.max if self.count else math.nan}
+        for quantile in self.quantiles:
+            summary["p%g" % (quantile.quantile * 100)] = quantile.value()
+        return summary
+
+
+class WindowAggregator(object):
+    """
+        Summarises readings over consecutive windows aligned to the epoch,
+        e.g. window=60 gives one summary per wall clock minute
+        Windows don't overlap: the statistics run from the start of the
+        current window and are reset when the next one begins
+        Usage:
+            minutes = WindowAggregator(60, callback=upload)
+            for reading in sensor.stream():
+                minutes.add(reading)
+    """
+    def __init__(self, window, percentiles=DEFAULT_PERCENTILES, callback=None,
+                 fields=MEASUREMENT_FIELDS):
+        self.window = window
+        self.percentiles = percentiles
+        self.callback = callback
+        self.fields = fields
+        self.window_start = None
+        self.stats = None
+
+    def _open(self, window_start):
+        """
+            Start collecting a new window
+        """
+        self.window_start = window_start
+        self.stats = [ChannelStats(self.percentiles) for _ in self.fields]
+
+    def add(self, reading):
+        """
+            Add a reading, returns the summary of the previous window when a
+            reading falls in a new one (None otherwise). None readings, as
+            yielded by Sensirion.stream() for missed ticks, are ignored.
+        """
+        if reading is None:
+            return None
+        window_start = reading.epoch - reading.epoch % self.window
+        summary = None
+        if window_start != self.window_start:
+            summary = self.flush()
+            self._open(window_start)
+        for field, stats in zip(self.fields, self.stats):
+            stats.add(getattr(reading, field))
+        return summary
+
+    def flush(self):
+        """
+            Emit the summary of the current (possibly partial) window
+        """
+        if self.stats is None:
+            return None
+        summary = {
+            "start": self.window_start,
+            "end": self.window_start + self.window,
+            "count": self.stats[0].count,
+        }
+        for field, stats in zip(self.fields, self.stats):
+            summary[field] = stats.summary()
+        self.window_start = None
+        self.stats = None
+        if self.callback is not None:
+            self.callback(summary)
+        return summary
@@ -0,0 +1,299 @@
+"""
+    asyncio interface to the Sensirion SPS030 sensor
+    Shares the SHDLC framing with Sensirion but never blocks the event loop
+"""
+
+import asyncio
+import logging
+from time import monotonic, time
+
+from serial import Serial, SerialException
+
+from . import shdlc
+from .retry import DefaultRetryPolicy, RetryBudget
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionException, SensirionFrameException,
+    SensirionTimeoutException)
+from .sensirion_sps030 import (
+    CMD_ADDR, CMD_DEVICE_INFORMATION, CMD_READ_MEASUREMENT,
+    CMD_READ_WRITE_AUTOCLEAN_INTERVAL, CMD_RESET, CMD_START_FAN_CLEANING,
+    CMD_START_MEASUREMENT, CMD_STOP_MEASUREMENT, DEFAULT_BAUD_RATE,
+    DEFAULT_LOGGING_LEVEL, DEFAULT_READ_DEADLINE, DEFAULT_READ_TIMEOUT, DEFAULT_RETRY_COUNT,
+    DEFAULT_SERIAL_PORT, MIN_SAMPLE_INTERVAL, RETRY_SLEEP, SUBCMD_ARTICLE_CODE,
+    SUBCMD_DEVICE_NAME, SUBCMD_READ_INTERVAL, SUBCMD_SERIAL_NO,
+    OUTPUT_FORMAT_FLOAT, SUBCMD_START_MEASUREMENT_1, RESET_DELAY_S,
+    SensirionReading, check_measurement_length, measurement_struct, response_timeout)
+
+
+class AsyncSerialStream(object):
+    """
+        Non-blocking access to a serial port driven by the event loop
+        Incoming bytes are split into frames as soon as the fd is readable
+    """
+    def __init__(self, serial, logger=None):
+        self.serial = serial
+        self.reader = shdlc.FrameReader(logger)
+        self._data = asyncio.Event()
+        self._error = None # Set once reading the port has failed
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.serial.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        """
+            Called by the event loop when the port has data waiting
+            A failed read is passed on to whoever is waiting for a frame
+        """
+        try:
+            data = self.serial.read(self.serial.in_waiting or 1)
+        except (SerialException, OSError) as exp:
+            self._loop.remove_reader(self.serial.fileno())
+            self._error = SensirionConnectionException(str(exp))
+            self._data.set()
+            return
+        if data:
+            self.reader.feed(data)
+            self._data.set()
+
+    def write(self, data):
+        """
+            Send a frame to the sensor
+        """
+        if self._error is not None:
+            raise self._error
+        try:
+            return self.serial.write(data)
+        except (SerialException, OSError) as exp:
+            raise SensirionConnectionException(str(exp))
+
+    async def read_frame(self, timeout):
+        """
+            Wait for the next complete frame from the sensor
+        """
+        deadline = monotonic() + timeout
+        frame = self.reader.next_frame()
+        while frame is None:
+            if self._error is not None:
+                raise self._error
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                self.reader.reset()
+                raise SensirionTimeoutException("Message incomplete")
+            self._data.clear()
+            try:
+                await asyncio.wait_for(self._data.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            frame = self.reader.next_frame()
+        return frame
+
+    def detach(self):
+        """
+            Stop watching the port but leave it open
+        """
+        self._loop.remove_reader(self.serial.fileno())
+
+    def close(self):
+        """
+            Stop watching the port and close it
+        """
+        self.detach()
+        self.serial.close()
+
+
+class AsyncSensirion(object):
+    """
+        Awaitable interface to the Sensirion SPS030 sensor
+        Use AsyncSensirion.create() or "async with" to open it
+    """
+    def __init__(
+            self, port=DEFAULT_SERIAL_PORT, baud=DEFAULT_BAUD_RATE,
+            read_timeout=DEFAULT_READ_TIMEOUT,
+            log_level=DEFAULT_LOGGING_LEVEL, retries=DEFAULT_RETRY_COUNT,
+            serial=None, retry_policy=None, read_deadline=DEFAULT_READ_DEADLINE,
+            output_format=OUTPUT_FORMAT_FLOAT):
+        """
+            Setup the interface for the sensor, the port is opened by open()
+        """
+        self.logger = logging.getLogger("SPS030 Interface")
+        self.logger.setLevel(log_level)
+        self.port = port
+        self.baud = baud
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.retry_policy = retry_policy or DefaultRetryPolicy(max_attempts=retries)
+        self.read_deadline = read_deadline
+        self.output_format = output_format
+        self._measurement_struct = measurement_struct(output_format)
+        self.measurement_running = False
+        self.last_measurement = None
+        self._serial = serial
+        self._stream = None
+        self._lock = None # Created in open() so it belongs to the running loop
+
+    @classmethod
+    async def create(cls, *args, auto_start=True, **kwargs):
+        """
+            Create the interface and open the sensor
+        """
+        sensor = cls(*args, **kwargs)
+        await sensor.open(auto_start)
+        return sensor
+
+    async def open(self, auto_start=True):
+        """
+            Open the port, reset the sensor and optionally start measuring
+        """
+        serial = self._serial
+        if serial is None:
+            try:
+                serial = Serial(port=self.port, baudrate=self.baud, timeout=0)
+            except SerialException as exp:
+                self.logger.error(str(exp))
+                raise SensirionConnectionException(str(exp))
+        self._stream = AsyncSerialStream(serial, self.logger)
+        self._lock = asyncio.Lock()
+        try:
+            await self.reset()
+            if auto_start:
+                await self.start_measurement()
+        except BaseException:
+            if self._serial is None:
+                self._stream.close() # Don't leak the port we opened
+            else:
+                self._stream.detach()
+            self._stream = None
+            raise
+
+    async def close(self):
+        """
+            Close the port
+        """
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    async def __aenter__(self):
+        if self._stream is None:
+            await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _command(self, cmd, data=b''):
+        """
+            Send a command and wait for the matching response (unstuffed)
+        """
+        if self._stream is None:
+            raise SensirionException("Port not open")
+        async with self._lock:
+            self._stream.write(shdlc.build_frame(CMD_ADDR, cmd, data))
+            frame = await self._stream.read_frame(response_timeout(cmd, self.read_timeout))
+            return shdlc.decode_response(frame, CMD_ADDR, cmd, self.logger)
+
+    async def start_measurement(self):
+        """
+            Send the command to start the sensor reading data
+        """
+        await self._command(CMD_START_MEASUREMENT, SUBCMD_START_MEASUREMENT_1 + self.output_format)
+        self.measurement_running = True
+        self.last_measurement = monotonic()
+
+    async def stop_measurement(self):
+        """
+            Send the command to stop the sensor reading data
+        """
+        await self._command(CMD_STOP_MEASUREMENT)
+        self.measurement_running = False
+
+    async def reset(self):
+        """
+            Send the reset command to the device
+        """
+        await self._command(CMD_RESET)
+        self.measurement_running = False
+        await asyncio.sleep(RESET_DELAY_S)
+
+    async def start_fan_clean(self):
+        """
+            Start a manual clean of the fan, takes 10s
+        """
+        await self._command(CMD_START_FAN_CLEANING)
+
+    async def get_product_name(self):
+        """
+            Get the product name string
+        """
+        return (await self._device_info(SUBCMD_DEVICE_NAME)).decode().rstrip('\0')
+
+    async def get_article_code(self):
+        """
+            Get the article Code
+        """
+        return (await self._device_info(SUBCMD_ARTICLE_CODE)).decode().rstrip('\0')
+
+    async def get_serial_no(self):
+        """
+            Get the serial number
+        """
+        return (await self._device_info(SUBCMD_SERIAL_NO)).decode().rstrip('\0')
+
+    async def _device_info(self, subcmd):
+        """
+            Get information from the device
+        """
+        return (await self._command(CMD_DEVICE_INFORMATION, subcmd))[5:-2]
+
+    async def read(self):
+        """
+            Wrapper for read_measurement to make it consistent with the other drivers
+        """
+        return await self.read_measurement()
+
+    async def read_measurement(self):
+        """
+            Read a measurement from the device
+        """
+        if not self.measurement_running:
+            self.logger.warning("Measurement not running, starting measurement")
+            await self.start_measurement()
+            await asyncio.sleep(RETRY_SLEEP)
+        time_diff = monotonic() - self.last_measurement
+        if time_diff < MIN_SAMPLE_INTERVAL:
+            self.logger.warning("Trying to read too frequently - forcing delay")
+            await asyncio.sleep(MIN_SAMPLE_INTERVAL - time_diff)
+        budget = RetryBudget(self.retry_policy, self.read_deadline, self.logger)
+        while True:
+            try:
+                recv = await self._command(CMD_READ_MEASUREMENT)
+                check_measurement_length(recv, self.output_format, self.logger)
+                self.last_measurement = monotonic()
+                return SensirionReading(recv, time(), self.output_format)
+            except SensirionException as exp:
+                delay = budget.delay(exp)
+                if delay is None:
+                    raise
+                if isinstance(exp, SensirionFrameException):
+                    self._stream.reader.reset() # Resync on the next frame
+                await asyncio.sleep(delay)
+
+    async def read_cleaning_interval(self):
+        """
+            Read the cleaning interval from the sensor
+        """
+        recv = await self._command(CMD_READ_WRITE_AUTOCLEAN_INTERVAL, SUBCMD_READ_INTERVAL)
+        return int.from_bytes(recv[5:-2], byteorder='big')
+
+    async def write_cleaning_interval(self, interval):
+        """
+            Sets the interval at which the fan should be cleaned
+            set to 0 to disable automatic cleaning
+        """
+        if interval == 0:
+            self.logger.warning("Disabling cleaning interval")
+        if interval > 0xFFFFFFFF:
+            self.logger.error("0x%x too large", interval)
+            raise SensirionException("Interval too large")
+        await self._command(
+            CMD_READ_WRITE_AUTOCLEAN_INTERVAL,
+            SUBCMD_READ_INTERVAL + int.to_bytes(interval, length=4, byteorder="big"))
@@ -0,0 +1,54 @@
+"""
+    Batch decoding of archived read measurement frames into NumPy arrays
+    NumPy is an optional dependency: pip install sensirion-sps030[numpy]
+"""
+
+from .byte_stuffing import unstuff
+from .sensirion_exception import SensirionException
+from .sensirion_sps030 import (
+    MEASUREMENT_FIELDS, MEASUREMENT_OFFSET, OUTPUT_FORMAT_FLOAT, OUTPUT_FORMAT_INTEGER,
+    measurement_struct)
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover - depends on the environment
+    np = None
+
+MEASUREMENT_DTYPE = [("epoch", "<f8")] + [(field, "<f4") for field in MEASUREMENT_FIELDS]
+WIRE_DTYPES = {OUTPUT_FORMAT_FLOAT: ">f4", OUTPUT_FORMAT_INTEGER: ">u2"}
+
+
+def _require_numpy():
+    if np is None:
+        raise SensirionException("NumPy is required for batch decoding")
+
+
+def decode_frames(frames, epochs=None, stuffed=False, output_format=OUTPUT_FORMAT_FLOAT):
+    """
+        Decode an iterable of read measurement frames into a structured array
+        with an epoch column and one float32 column per measurement field.
+        Frames are the unstuffed messages (as returned by Sensirion._rx)
+        unless stuffed is True, all in the given output format. Values are
+        not rounded.
+    """
+    _require_numpy()
+    end = MEASUREMENT_OFFSET + measurement_struct(output_format).size
+    payload = bytearray()
+    count = 0
+    for frame in frames:
+        if stuffed:
+            frame = unstuff(frame)
+        if len(frame) < end + 1:
+            raise SensirionException("Data too short to parse")
+        payload += frame[MEASUREMENT_OFFSET:end]
+        count += 1
+    values = np.frombuffer(
+        bytes(payload), dtype=WIRE_DTYPES[output_format]).reshape(count, len(MEASUREMENT_FIELDS))
+    out = np.empty(count, dtype=MEASUREMENT_DTYPE)
+    for index, field in enumerate(MEASUREMENT_FIELDS):
+        out[field] = values[:, index]
+    if epochs is None:
+        out["epoch"] = np.nan
+    else:
+        out["epoch"] = np.asarray(epochs, dtype="<f8")
+    return out
@@ -0,0 +1,67 @@
+"""
+    Byte stuffing used by the SHDLC protocol on the SPS030 UART interface
+    0x7E, 0x7D, 0x11 and 0x13 are sent as 0x7D followed by the byte XOR 0x20
+"""
+
+import re
+
+from .sensirion_exception import SensirionFrameException
+
+ESCAPE = 0x7D
+
+STUFF_MAP = {
+    b'\x7e': b'\x7d\x5e',
+    b'\x7d': b'\x7d\x5d',
+    b'\x11': b'\x7d\x31',
+    b'\x13': b'\x7d\x33',
+}
+UNSTUFF_MAP = {value: key for key, value in STUFF_MAP.items()}
+
+_SPECIAL_BYTES = b''.join(STUFF_MAP)
+_STUFF_RE = re.compile(b'[' + re.escape(_SPECIAL_BYTES) + b']')
+_UNSTUFF_RE = re.compile(b'\x7d(.?)', re.DOTALL)
+
+
+def _as_bytes(data):
+    """
+        The regular expressions only accept bytes-like objects that support
+        the buffer protocol fully, memoryview slices are copied
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return bytes(data)
+
+
+def _unstuff_match(match):
+    """
+        Replace a single escape sequence, rejecting truncated or unknown ones
+    """
+    escaped = match.group(0)
+    if len(escaped) < 2:
+        raise SensirionFrameException("Truncated escape sequence", "escape_failures")
+    try:
+        return UNSTUFF_MAP[escaped]
+    except KeyError:
+        raise SensirionFrameException(
+            "Invalid escape sequence 0x%s" % escaped.hex(), "escape_failures")
+
+
+def stuff(data):
+    """
+        Convert the data into the stuffed format required for transmission
+    """
+    data = _as_bytes(data)
+    if len(data.translate(None, _SPECIAL_BYTES)) == len(data):
+        return bytes(data) # Nothing to escape
+    return _STUFF_RE.sub(lambda match: STUFF_MAP[match.group(0)], data)
+
+
+def unstuff(data):
+    """
+        Reverse the data stuffing used on the serial protocol
+        Raises SensirionFrameException on a truncated or invalid escape
+    """
+    data = _as_bytes(data)
+    if data.find(ESCAPE) < 0:
+        return bytes(data)
+    return _UNSTUFF_RE.sub(_unstuff_match, data)
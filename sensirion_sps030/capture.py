@@ -0,0 +1,232 @@
+"""
+    Recording and replay of the traffic exchanged with a sensor
+    A FrameCapture passed as Sensirion(frame_trace=...) writes every frame
+    sent and received to a compact binary file with a monotonic timestamp.
+    ReplaySerial plays a capture back to Sensirion in place of the port, as
+    fast as the decoder can go, so field problems can be reproduced and
+    decoder changes checked against real traffic.
+"""
+
+import struct
+from collections import namedtuple
+from time import monotonic, sleep, time
+
+from .byte_stuffing import unstuff
+from .retry import RetryPolicy
+from .sensirion_error_codes import ERROR_CODE_NO_ERROR
+from .sensirion_exception import SensirionException, SensirionTimeoutException
+from .sensirion_sps030 import CMD_ADDR, CMD_READ_MEASUREMENT, Sensirion
+from .shdlc import MIN_MOSI_FRAME_LENGTH, TRACE_RX, TRACE_TX, FrameReader, build_response
+
+MAGIC = b'SPS30CAP'
+VERSION = 1
+HEADER = struct.Struct('<8sHdd') # magic, version, epoch and monotonic time at the start
+RECORD = struct.Struct('<dBH') # monotonic time, direction, frame length
+DIRECTIONS = (TRACE_TX, TRACE_RX) # Stored as the index
+
+CaptureRecord = namedtuple("CaptureRecord", ("time", "epoch", "direction", "frame"))
+
+
+class FrameCapture(object):
+    """
+        Frame trace hook writing every frame to a capture file
+        Usage:
+            with FrameCapture("sensor.cap") as capture:
+                sensor = Sensirion(port, frame_trace=capture)
+        trace is another hook to pass the frames on to, if any
+    """
+    def __init__(self, path, trace=None):
+        self.path = path
+        self.trace = trace
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, time(), monotonic()))
+
+    def __call__(self, direction, frame):
+        self._file.write(RECORD.pack(monotonic(), DIRECTIONS.index(direction), len(frame)))
+        self._file.write(frame)
+        if self.trace is not None:
+            self.trace(direction, frame)
+
+    def flush(self):
+        """
+            Push buffered frames to the file
+        """
+        self._file.flush()
+
+    def close(self):
+        """
+            Close the capture file
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_capture(path):
+    """
+        Yield the CaptureRecord in a capture file in the order they were recorded
+    """
+    with open(path, "rb") as capture:
+        header = capture.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise SensirionException("%s is not a capture" % path)
+        magic, version, start_epoch, start_time = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise SensirionException("%s is not a capture" % path)
+        while True:
+            record = capture.read(RECORD.size)
+            if len(record) < RECORD.size:
+                return # A capture cut short keeps everything before the last record
+            timestamp, direction, length = RECORD.unpack(record)
+            frame = capture.read(length)
+            if len(frame) < length:
+                return
+            yield CaptureRecord(
+                timestamp, start_epoch + timestamp - start_time, DIRECTIONS[direction], frame)
+
+
+class ReplaySerial(object):
+    """
+        Serial-like object answering commands with the responses in a capture
+        Each command written is matched to the next captured command: if it
+        is the same command the captured responses are returned, otherwise
+        the command is acknowledged without consuming the capture (counted in
+        acknowledged). A command that got no response in the capture times
+        out straight away.
+        speed replays the captured response times that many times faster,
+        by default responses are available immediately.
+    """
+    def __init__(self, path, speed=None, timeout=1):
+        self.path = path
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+        self.epoch = None # Time the last response was captured
+        self.acknowledged = 0
+        self._records = read_capture(path)
+        self._next = self._next_command()
+        self._reader = FrameReader(min_length=MIN_MOSI_FRAME_LENGTH)
+        self._buffer = bytearray()
+        self._ready = 0 # When the buffered responses may be read
+
+    def _next_command(self):
+        """
+            Skip to the next frame sent to the sensor
+        """
+        for record in self._records:
+            if record.direction == TRACE_TX:
+                return record
+        return None
+
+    @property
+    def next_command(self):
+        """
+            Command byte of the next captured command, None at the end
+        """
+        return None if self._next is None else unstuff(self._next.frame)[2]
+
+    def skip(self):
+        """
+            Drop the next captured command and its responses
+        """
+        return self._take()
+
+    def _take(self):
+        """
+            Consume the next captured command, returns it and its responses
+        """
+        request, responses = self._next, []
+        self._next = None
+        for record in self._records:
+            if record.direction == TRACE_TX:
+                self._next = record
+                break
+            responses.append(record)
+        return request, responses
+
+    def write(self, data):
+        """
+            Queue the captured responses to the commands written
+        """
+        self._reader.feed(data)
+        frame = self._reader.next_frame()
+        while frame is not None:
+            cmd = unstuff(frame)[2]
+            if cmd == self.next_command:
+                request, responses = self._take()
+                if responses:
+                    self.epoch = responses[-1].epoch
+                    if self.speed:
+                        self._ready = monotonic() + (
+                            responses[-1].time - request.time) / self.speed
+                for response in responses:
+                    self._buffer += response.frame
+            else:
+                self.acknowledged += 1
+                self._buffer += build_response(CMD_ADDR, bytes([cmd]), ERROR_CODE_NO_ERROR)
+            frame = self._reader.next_frame()
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        """
+            Number of bytes that can be read without waiting
+        """
+        return len(self._buffer) if monotonic() >= self._ready else 0
+
+    def read(self, size=1):
+        """
+            Read up to size bytes of the captured responses
+        """
+        if not self._buffer:
+            raise SensirionTimeoutException("No response captured")
+        wait = self._ready - monotonic()
+        if wait > 0:
+            sleep(wait)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def flush(self):
+        """
+            Nothing is ever buffered on the way out
+        """
+        pass
+
+    def reset_input_buffer(self):
+        """
+            Discard the responses not read yet
+        """
+        del self._buffer[:]
+
+    def close(self):
+        """
+            Mark the port closed
+        """
+        self.is_open = False
+
+
+def replay(path, speed=None, **sensor_args):
+    """
+        Yield the readings decoded from every measurement in a capture, with
+        the epoch they were captured at. Reads that fail are logged and
+        skipped, other commands in the capture are ignored.
+        Other arguments are passed on to Sensirion.
+    """
+    port = ReplaySerial(path, speed)
+    sensor_args.setdefault("retry_policy", RetryPolicy()) # Retries are in the capture
+    sensor = Sensirion(serial=port, auto_start=False, **sensor_args)
+    while port.next_command is not None:
+        if port.next_command != CMD_READ_MEASUREMENT[0]:
+            port.skip()
+            continue
+        try:
+            reading = sensor._read_with_retries() # pylint: disable=protected-access
+        except SensirionException:
+            continue
+        reading.epoch = port.epoch
+        yield reading
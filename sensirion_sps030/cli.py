@@ -0,0 +1,52 @@
+"""
+    Console entry point returning one reading from a sensor
+"""
+
+import logging
+from argparse import ArgumentParser
+
+from .capture import FrameCapture
+from .sensirion_sps030 import Sensirion
+from .shdlc import log_frames
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(lineno)d - %(levelname)s - %(message)s'
+
+
+def main():
+    """
+        Print one reading from the sensor attached to the given port
+    """
+    parser = ArgumentParser(
+        description="Return one reading from the SPS030 sensor attached to the specified serial port")
+    logging_output = parser.add_mutually_exclusive_group()
+    logging_output.add_argument(
+        "-q", "--quiet", action="store_true", help="Suppress most output")
+    logging_output.add_argument(
+        "-v", "--verbose", action="store_true", help="Maximum verbosity output on command line")
+    parser.add_argument(
+        "-c", "--capture", action="store", default=None,
+        help="Record the frames exchanged with the sensor to this file")
+    parser.add_argument("sensor_port", action="store", help="Port to which the sensor is connected")
+    args = parser.parse_args()
+    log_level = logging.INFO
+    if args.quiet:
+        log_level = logging.ERROR
+    elif args.verbose:
+        log_level = logging.DEBUG
+    logging.basicConfig(format=LOG_FORMAT)
+    frame_trace = log_frames() if args.verbose else None
+    if args.capture is not None:
+        frame_trace = FrameCapture(args.capture, frame_trace)
+    try:
+        sensor = Sensirion(port=args.sensor_port, log_level=log_level, frame_trace=frame_trace)
+        try:
+            sensor.logger.info("reading: %s", sensor.read_measurement())
+        finally:
+            sensor.close()
+    finally:
+        if args.capture is not None:
+            frame_trace.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+    Collector daemon: samples many sensors from several worker processes
+    Ports are sharded across the workers, each running the Sensirion read
+    loop for its share, and readings are published into a ring buffer in
+    shared memory. Consumers in any process attach to the ring by name and
+    read fixed width records from it, nothing is pickled.
+    Needs Python 3.8 or later for multiprocessing.shared_memory.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+from argparse import ArgumentParser
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+from time import monotonic, sleep
+
+from .cli import LOG_FORMAT
+from .sensirion_exception import SensirionException
+from .sensirion_sps030 import MEASUREMENT_FIELDS, MIN_SAMPLE_INTERVAL
+from .supervisor import SupervisedSensirion
+
+MAGIC = b'SPS30BUS'
+HEADER = struct.Struct('<8sQQ') # magic, capacity, written
+HEADER_SIZE = 64
+WRITTEN_OFFSET = 16 # Offset of the count of records written in the header
+
+# Sequence number (record index + 1, 0 while being written), epoch, sensor
+# index and the ten measurements, padded to 64 bytes
+SLOT = struct.Struct('<QdI10f')
+SLOT_SIZE = 64
+SEQUENCE = struct.Struct('<Q')
+
+DEFAULT_BUS_CAPACITY = 4096
+DEFAULT_POLL_INTERVAL = 0.1
+WORKER_STOP_TIMEOUT = 5
+
+BusReading = namedtuple("BusReading", ("sensor", "epoch") + MEASUREMENT_FIELDS)
+
+
+class ReadingBus(object):
+    """
+        Ring buffer of readings in shared memory
+        Any number of processes can publish (holding lock) and read (without
+        locking, torn records are detected with the sequence numbers).
+    """
+    def __init__(self, name=None, capacity=DEFAULT_BUS_CAPACITY, lock=None, track=False):
+        """
+            Creates a new bus if name is None, otherwise attaches to an
+            existing one. Before Python 3.13 shared memory is removed when a
+            process tracking it exits, so attach with track=True only from
+            processes started by the creator.
+        """
+        self.lock = lock
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=HEADER_SIZE + capacity * SLOT_SIZE)
+            HEADER.pack_into(self._shm.buf, 0, MAGIC, capacity, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            if not track:
+                resource_tracker.unregister(self._shm._name, "shared_memory") # pylint: disable=protected-access
+        magic, self.capacity, _ = HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC:
+            self._shm.close()
+            raise SensirionException("%s is not a reading bus" % name)
+        self.name = self._shm.name
+
+    @property
+    def written(self):
+        """
+            Total number of readings ever published
+        """
+        return SEQUENCE.unpack_from(self._shm.buf, WRITTEN_OFFSET)[0]
+
+    def publish(self, sensor, reading):
+        """
+            Add a reading from the sensor with the given index
+        """
+        if self.lock is not None:
+            with self.lock:
+                self._publish(sensor, reading)
+        else:
+            self._publish(sensor, reading)
+
+    def _publish(self, sensor, reading):
+        buf = self._shm.buf
+        written = self.written
+        offset = HEADER_SIZE + (written % self.capacity) * SLOT_SIZE
+        SEQUENCE.pack_into(buf, offset, 0) # Mark the slot as being written
+        SLOT.pack_into(
+            buf, offset, 0, reading.epoch, sensor,
+            *[getattr(reading, field) for field in MEASUREMENT_FIELDS])
+        SEQUENCE.pack_into(buf, offset, written + 1)
+        SEQUENCE.pack_into(buf, WRITTEN_OFFSET, written + 1)
+
+    def get(self, index):
+        """
+            The index-th reading ever published, None if it has been
+            overwritten (or is being written)
+        """
+        buf = self._shm.buf
+        offset = HEADER_SIZE + (index % self.capacity) * SLOT_SIZE
+        record = SLOT.unpack_from(buf, offset)
+        if record[0] != index + 1 or SEQUENCE.unpack_from(buf, offset)[0] != index + 1:
+            return None
+        return BusReading._make(record[2:3] + record[1:2] + record[3:])
+
+    def close(self):
+        """
+            Detach from the shared memory
+        """
+        self._shm.close()
+
+    def unlink(self):
+        """
+            Remove the shared memory, once every process has closed it
+        """
+        self._shm.unlink()
+
+
+class BusReader(object):
+    """
+        Cursor following a ReadingBus
+    """
+    def __init__(self, bus, from_start=False):
+        """
+            Only readings published from now on are returned unless from_start
+            is set, in which case those still in the ring are too
+        """
+        self.bus = bus
+        self.cursor = max(0, bus.written - bus.capacity) if from_start else bus.written
+        self.missed = 0 # Readings overwritten before they could be read
+
+    def poll(self):
+        """
+            List of the BusReading published since the last call
+        """
+        written = self.bus.written
+        oldest = written - self.bus.capacity
+        if self.cursor < oldest:
+            self.missed += oldest - self.cursor
+            self.cursor = oldest
+        readings = []
+        while self.cursor < written:
+            reading = self.bus.get(self.cursor)
+            if reading is None:
+                self.missed += 1
+            else:
+                readings.append(reading)
+            self.cursor += 1
+        return readings
+
+    def __iter__(self):
+        """
+            Yield readings as they are published, forever
+        """
+        while True:
+            readings = self.poll()
+            if not readings:
+                sleep(DEFAULT_POLL_INTERVAL)
+            for reading in readings:
+                yield reading
+
+
+def _worker(bus_name, lock, ports, interval, sensor_args, stop):
+    """
+        Read loop run in each worker process
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent decides when to stop
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    bus = ReadingBus(bus_name, lock=lock, track=True)
+    sensors = [(index, SupervisedSensirion(port=port, **sensor_args)) for index, port in ports]
+    try:
+        next_tick = monotonic()
+        while not stop.is_set():
+            for index, sensor in sensors:
+                reading = sensor.read()
+                if reading is not None:
+                    bus.publish(index, reading)
+            next_tick += interval
+            wait = next_tick - monotonic()
+            if wait < 0: # Overran, skip the missed ticks
+                next_tick -= wait
+                wait = 0
+            stop.wait(wait)
+    finally:
+        for _, sensor in sensors:
+            sensor.close()
+        bus.close()
+
+
+class Collector(object):
+    """
+        Runs worker processes sampling the given ports into a ReadingBus
+        Usage:
+            with Collector(["/dev/ttyUSB0", "/dev/ttyUSB1"]) as collector:
+                for reading in collector.reader():
+                    print(collector.ports[reading.sensor], reading.pm25)
+        Other arguments are passed on to SupervisedSensirion.
+    """
+    def __init__(
+            self, ports, workers=None, interval=MIN_SAMPLE_INTERVAL,
+            capacity=DEFAULT_BUS_CAPACITY, **sensor_args):
+        if not ports:
+            raise SensirionException("No ports to collect from")
+        self.logger = logging.getLogger("SPS030 Interface")
+        self.ports = list(ports)
+        self.workers = min(len(self.ports), workers or os.cpu_count() or 1)
+        self.interval = interval
+        self.capacity = capacity
+        self.sensor_args = sensor_args
+        self.bus = None
+        self._stop = None
+        self._processes = []
+
+    def start(self):
+        """
+            Create the bus and start the workers
+        """
+        self.bus = ReadingBus(capacity=self.capacity, lock=multiprocessing.Lock())
+        self._stop = multiprocessing.Event()
+        shards = [[] for _ in range(self.workers)]
+        for index, port in enumerate(self.ports):
+            shards[index % self.workers].append((index, port))
+        for shard in shards:
+            process = multiprocessing.Process(
+                target=_worker, daemon=True,
+                args=(self.bus.name, self.bus.lock, shard, self.interval,
+                      self.sensor_args, self._stop))
+            process.start()
+            self._processes.append(process)
+        self.logger.info(
+            "Collecting from %d ports with %d workers on bus %s",
+            len(self.ports), self.workers, self.bus.name)
+        return self
+
+    def reader(self, from_start=False):
+        """
+            A BusReader on the collector's bus
+        """
+        return BusReader(self.bus, from_start)
+
+    def stop(self):
+        """
+            Stop the workers and remove the bus
+        """
+        if self._stop is not None:
+            self._stop.set()
+        for process in self._processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        if self.bus is not None:
+            self.bus.close()
+            self.bus.unlink()
+            self.bus = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _terminate(signum, frame):
+    """
+        Stop cleanly when run as a service
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_IGN) # Let the shutdown finish
+    raise KeyboardInterrupt
+
+
+def main():
+    """
+        Console entry point, prints readings from every port as JSON lines
+    """
+    parser = ArgumentParser(
+        description="Collect readings from SPS030 sensors on several serial ports")
+    logging_output = parser.add_mutually_exclusive_group()
+    logging_output.add_argument(
+        "-q", "--quiet", action="store_true", help="Suppress most output")
+    logging_output.add_argument(
+        "-v", "--verbose", action="store_true", help="Maximum verbosity output on command line")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of worker processes (default: one per CPU)")
+    parser.add_argument(
+        "-i", "--interval", type=float, default=MIN_SAMPLE_INTERVAL,
+        help="Seconds between readings")
+    parser.add_argument(
+        "-c", "--capacity", type=int, default=DEFAULT_BUS_CAPACITY,
+        help="Readings held in the shared memory bus")
+    parser.add_argument("ports", nargs="+", help="Ports to which the sensors are connected")
+    args = parser.parse_args()
+    log_level = logging.INFO
+    if args.quiet:
+        log_level = logging.ERROR
+    elif args.verbose:
+        log_level = logging.DEBUG
+    logging.basicConfig(format=LOG_FORMAT)
+    signal.signal(signal.SIGTERM, _terminate)
+    with Collector(
+            args.ports, workers=args.workers, interval=args.interval,
+            capacity=args.capacity, log_level=log_level) as collector:
+        try:
+            for reading in collector.reader():
+                record = {"port": collector.ports[reading.sensor], "epoch": reading.epoch}
+                for field in MEASUREMENT_FIELDS: # Drop the float32 noise
+                    record[field] = float("%.7g" % getattr(reading, field))
+                print(json.dumps(record), flush=True)
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+
+
+if __name__ == "__main__":
+    main()
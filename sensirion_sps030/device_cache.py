@@ -0,0 +1,70 @@
+"""
+    Persistent cache of device information keyed by port and serial number
+"""
+
+import json
+import os
+import tempfile
+
+
+class DeviceInfoCache(object):
+    """
+        Keeps product name, article code and cleaning interval of each sensor
+        in a JSON file so they don't have to be read back after a restart.
+        Entries are keyed by port and serial number, so swapping the sensor
+        on a port never returns the old sensor's details.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as cache_file:
+                self._entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, port, serial_no, key):
+        """
+            Cached value or None
+        """
+        return self._entries.get(port, {}).get(serial_no, {}).get(key)
+
+    def set(self, port, serial_no, key, value):
+        """
+            Store a value and write the file
+        """
+        # Only keep the sensor currently on the port
+        entry = self._entries.setdefault(port, {})
+        if serial_no not in entry:
+            entry.clear()
+            entry[serial_no] = {}
+        entry[serial_no][key] = value
+        self._save()
+
+    def invalidate(self, port, serial_no=None, key=None):
+        """
+            Forget a single value, everything known about a sensor or a port
+        """
+        entry = self._entries.get(port)
+        if entry is None:
+            return
+        if serial_no is None:
+            del self._entries[port]
+        elif key is None:
+            entry.pop(serial_no, None)
+        else:
+            entry.get(serial_no, {}).pop(key, None)
+        self._save()
+
+    def _save(self):
+        """
+            Atomically replace the cache file
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".sps030-cache")
+        try:
+            with os.fdopen(handle, "w") as cache_file:
+                json.dump(self._entries, cache_file, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,452 @@
+"""
+    Software emulation of an SPS30 speaking SHDLC over UART
+    Lets the interface be exercised and benchmarked without hardware, either
+    in memory (LoopbackSerial) or behind a pseudo terminal (PtyEmulator)
+"""
+
+import errno
+import os
+import random
+import struct
+import threading
+from time import monotonic, sleep
+
+from . import i2c, shdlc
+from .byte_stuffing import unstuff
+from .sensirion_error_codes import (
+    ERROR_CODE_CMD_NOT_ALLOWED, ERROR_CODE_ILLEGAL_CMD, ERROR_CODE_NO_ERROR,
+    ERROR_CODE_UNKNOWN_CMD, ERROR_CODE_WRONG_LENGTH)
+from .sensirion_exception import SensirionException
+from .sensirion_sps030 import (
+    CMD_ADDR, CMD_DEVICE_INFORMATION, CMD_READ_MEASUREMENT,
+    CMD_READ_WRITE_AUTOCLEAN_INTERVAL, CMD_RESET, CMD_START_FAN_CLEANING,
+    CMD_START_MEASUREMENT, CMD_STOP_MEASUREMENT, MEASUREMENT_STRUCTS, MIN_SAMPLE_INTERVAL,
+    OUTPUT_FORMAT_FLOAT, OUTPUT_FORMAT_INTEGER, SUBCMD_ARTICLE_CODE,
+    SUBCMD_DEVICE_NAME, SUBCMD_SERIAL_NO, SUBCMD_START_MEASUREMENT_1)
+
+DEFAULT_CLEANING_INTERVAL = 604800 # One week, the factory default
+MAX_INTEGER_VALUE = 0xFFFF
+
+
+def pack_measurement(values, output_format):
+    """
+        Measurement payload as the sensor sends it in the given output format,
+        values are as in float mode (typical particle size in um)
+    """
+    if output_format == OUTPUT_FORMAT_INTEGER:
+        values = [
+            min(MAX_INTEGER_VALUE, int(round(value))) for value in
+            list(values[:-1]) + [values[-1] * 1000]]
+    return MEASUREMENT_STRUCTS[output_format].pack(*values)
+
+
+class SPS30Emulator(object):
+    """
+        Model of the sensor: takes request bytes, returns response bytes
+    """
+    def __init__(
+            self, product_name="SPS30", article_code="00080000",
+            serial_no="0123456789ABCDEF", cleaning_interval=DEFAULT_CLEANING_INTERVAL,
+            measurement=None, seed=None):
+        """
+            measurement is a callable returning the ten values to report,
+            by default they are random but plausible
+        """
+        self.device_info = {
+            SUBCMD_DEVICE_NAME: product_name,
+            SUBCMD_ARTICLE_CODE: article_code,
+            SUBCMD_SERIAL_NO: serial_no,
+        }
+        self.cleaning_interval = cleaning_interval
+        self.measuring = False
+        self.output_format = OUTPUT_FORMAT_FLOAT
+        self._random = random.Random(seed)
+        self.measurement = measurement or self._random_measurement
+        self._reader = shdlc.FrameReader(min_length=shdlc.MIN_MOSI_FRAME_LENGTH)
+        self.handlers = {
+            CMD_START_MEASUREMENT[0]: self._start_measurement,
+            CMD_STOP_MEASUREMENT[0]: self._stop_measurement,
+            CMD_READ_MEASUREMENT[0]: self._read_measurement,
+            CMD_READ_WRITE_AUTOCLEAN_INTERVAL[0]: self._autoclean_interval,
+            CMD_START_FAN_CLEANING[0]: self._start_fan_cleaning,
+            CMD_DEVICE_INFORMATION[0]: self._device_information,
+            CMD_RESET[0]: self._reset,
+        }
+
+    def process(self, data):
+        """
+            Feed bytes sent to the sensor, returns a list of response frames
+        """
+        self._reader.feed(data)
+        responses = []
+        frame = self._reader.next_frame()
+        while frame is not None:
+            response = self.handle(frame)
+            if response is not None:
+                responses.append(response)
+            frame = self._reader.next_frame()
+        return responses
+
+    def handle(self, frame):
+        """
+            Answer a single (stuffed) MOSI frame, None if it is ignored
+        """
+        try:
+            request = unstuff(frame)
+        except SensirionException:
+            return None
+        addr, cmd, length = request[1], request[2], request[3]
+        data = request[4:-2]
+        if shdlc.calculate_checksum(request[1:4], data)[0] != request[-2]:
+            return None # The real sensor stays silent on a corrupted frame
+        if addr != CMD_ADDR[0]:
+            return None
+        if length != len(data):
+            return self.response(cmd, ERROR_CODE_WRONG_LENGTH)
+        handler = self.handlers.get(cmd)
+        if handler is None:
+            return self.response(cmd, ERROR_CODE_UNKNOWN_CMD)
+        state, payload = handler(data)
+        return self.response(cmd, state, payload)
+
+    @staticmethod
+    def response(cmd, state, data=b''):
+        """
+            Build a stuffed MISO frame
+        """
+        return shdlc.build_response(CMD_ADDR, bytes([cmd]), state, data)
+
+    def _random_measurement(self):
+        pm1 = self._random.uniform(0, 50)
+        return (
+            pm1, pm1 * 1.1, pm1 * 1.15, pm1 * 1.2,
+            pm1 * 7, pm1 * 8, pm1 * 8.2, pm1 * 8.25, pm1 * 8.3,
+            self._random.uniform(0.3, 1.5))
+
+    def _start_measurement(self, data):
+        if (len(data) != 2 or data[:1] != SUBCMD_START_MEASUREMENT_1 or
+                data[1:] not in MEASUREMENT_STRUCTS):
+            return ERROR_CODE_ILLEGAL_CMD, b''
+        if self.measuring:
+            return ERROR_CODE_CMD_NOT_ALLOWED, b''
+        self.measuring = True
+        self.output_format = bytes(data[1:])
+        return ERROR_CODE_NO_ERROR, b''
+
+    def _stop_measurement(self, data):
+        if data:
+            return ERROR_CODE_WRONG_LENGTH, b''
+        if not self.measuring:
+            return ERROR_CODE_CMD_NOT_ALLOWED, b''
+        self.measuring = False
+        return ERROR_CODE_NO_ERROR, b''
+
+    def _read_measurement(self, data):
+        if data:
+            return ERROR_CODE_WRONG_LENGTH, b''
+        if not self.measuring:
+            return ERROR_CODE_CMD_NOT_ALLOWED, b''
+        return ERROR_CODE_NO_ERROR, pack_measurement(self.measurement(), self.output_format)
+
+    def _autoclean_interval(self, data):
+        if len(data) == 1:
+            return ERROR_CODE_NO_ERROR, struct.pack('>I', self.cleaning_interval)
+        if len(data) == 5:
+            self.cleaning_interval = struct.unpack('>I', data[1:])[0]
+            return ERROR_CODE_NO_ERROR, b''
+        return ERROR_CODE_WRONG_LENGTH, b''
+
+    def _start_fan_cleaning(self, data):
+        if data:
+            return ERROR_CODE_WRONG_LENGTH, b''
+        if not self.measuring:
+            return ERROR_CODE_CMD_NOT_ALLOWED, b''
+        return ERROR_CODE_NO_ERROR, b''
+
+    def _device_information(self, data):
+        value = self.device_info.get(bytes(data))
+        if value is None:
+            return ERROR_CODE_ILLEGAL_CMD, b''
+        return ERROR_CODE_NO_ERROR, value.encode() + b'\0'
+
+    def _reset(self, data):
+        if data:
+            return ERROR_CODE_WRONG_LENGTH, b''
+        self.measuring = False
+        return ERROR_CODE_NO_ERROR, b''
+
+
+class FaultInjector(object):
+    """
+        Drops or corrupts response frames with the given probabilities
+    """
+    def __init__(self, corruption=0.0, drop=0.0, seed=None):
+        self.corruption = corruption
+        self.drop = drop
+        self._random = random.Random(seed)
+
+    def apply(self, frame):
+        """
+            Returns the frame as it should be sent, None if it is dropped
+        """
+        if self.drop and self._random.random() < self.drop:
+            return None
+        if self.corruption and self._random.random() < self.corruption:
+            frame = bytearray(frame)
+            index = self._random.randrange(1, len(frame) - 1)
+            frame[index] ^= 1 << self._random.randrange(8)
+            frame = bytes(frame)
+        return frame
+
+
+class LoopbackSerial(object):
+    """
+        In-memory serial-like object connected to an emulated sensor
+        Can be passed to Sensirion(serial=...) in place of a real port
+    """
+    def __init__(
+            self, emulator=None, latency=0.0, corruption=0.0, drop=0.0,
+            seed=None, timeout=1):
+        self.emulator = emulator or SPS30Emulator(seed=seed)
+        self.latency = latency
+        self.faults = FaultInjector(corruption, drop, seed)
+        self.timeout = timeout
+        self.is_open = True
+        self._pending = [] # (time ready, bytes) waiting for the latency to pass
+        self._buffer = bytearray()
+
+    def write(self, data):
+        """
+            Send bytes to the emulated sensor
+        """
+        ready = monotonic() + self.latency
+        for frame in self.emulator.process(data):
+            frame = self.faults.apply(frame)
+            if frame is not None:
+                self._pending.append((ready, frame))
+        return len(data)
+
+    def _collect(self):
+        """
+            Move responses whose latency has passed into the read buffer
+        """
+        now = monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._buffer += self._pending.pop(0)[1]
+
+    @property
+    def in_waiting(self):
+        """
+            Number of bytes that can be read without waiting
+        """
+        self._collect()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        """
+            Read up to size bytes, waiting at most timeout for the first one
+        """
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        self._collect()
+        while not self._buffer and self._pending:
+            wait = self._pending[0][0] - monotonic()
+            if deadline is not None:
+                wait = min(wait, deadline - monotonic())
+                if wait < 0:
+                    break
+            if wait > 0:
+                sleep(wait)
+            self._collect()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def flush(self):
+        """
+            Nothing is ever buffered on the way out
+        """
+        pass
+
+    def reset_input_buffer(self):
+        """
+            Discard anything the sensor has sent
+        """
+        self._pending = []
+        del self._buffer[:]
+
+    def close(self):
+        """
+            Mark the port closed
+        """
+        self.is_open = False
+
+
+class FakeI2CBus(object):
+    """
+        Emulated sensor on an I2C bus, shares its state with an SPS30Emulator
+        Can be passed to SensirionI2C(transport=...) in place of a real bus.
+        Like the real sensor it doesn't acknowledge (OSError) unknown
+        commands or arguments with a wrong CRC, and a new measurement is
+        ready sample_interval seconds after starting or the previous read.
+    """
+    def __init__(
+            self, emulator=None, corruption=0.0, seed=None,
+            sample_interval=MIN_SAMPLE_INTERVAL):
+        self.emulator = emulator or SPS30Emulator(seed=seed)
+        self.corruption = corruption
+        self.sample_interval = sample_interval
+        self._random = random.Random(seed)
+        self.is_open = True
+        self._next_sample = None # When the next measurement is ready
+        self._response = b''
+        self.handlers = {
+            i2c.CMD_START_MEASUREMENT: self._start_measurement,
+            i2c.CMD_STOP_MEASUREMENT: self._stop_measurement,
+            i2c.CMD_READ_DATA_READY: self._read_data_ready,
+            i2c.CMD_READ_MEASUREMENT: self._read_measurement,
+            i2c.CMD_READ_WRITE_AUTOCLEAN_INTERVAL: self._autoclean_interval,
+            i2c.CMD_START_FAN_CLEANING: lambda data: b'',
+            i2c.CMD_READ_PRODUCT_TYPE: self._product_type,
+            i2c.CMD_READ_SERIAL_NO: self._serial_no,
+            i2c.CMD_RESET: self._reset,
+        }
+
+    def write(self, data):
+        """
+            Receive a command pointer and its arguments
+        """
+        if len(data) < 2:
+            raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+        handler = self.handlers.get(struct.unpack('>H', data[:2])[0])
+        try:
+            args = i2c.check_crcs(data[2:])
+        except SensirionException:
+            handler = None
+        if handler is None:
+            raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+        self._response = i2c.add_crcs(handler(args))
+        return len(data)
+
+    def read(self, count):
+        """
+            Read the response to the last command
+        """
+        data = bytearray(self._response[:count].ljust(count, b'\xff'))
+        if self.corruption and self._random.random() < self.corruption:
+            data[self._random.randrange(count)] ^= 1 << self._random.randrange(8)
+        return bytes(data)
+
+    def close(self):
+        """
+            Mark the bus closed
+        """
+        self.is_open = False
+
+    def _start_measurement(self, data):
+        if bytes(data[:1]) not in MEASUREMENT_STRUCTS:
+            raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+        self.emulator.output_format = bytes(data[:1])
+        self.emulator.measuring = True
+        self._next_sample = monotonic() + self.sample_interval
+        return b''
+
+    def _stop_measurement(self, data):
+        self.emulator.measuring = False
+        return b''
+
+    @property
+    def data_ready(self):
+        """
+            True if a new measurement can be read
+        """
+        return self.emulator.measuring and monotonic() >= self._next_sample
+
+    def _read_data_ready(self, data):
+        return bytes([0, int(self.data_ready)])
+
+    def _read_measurement(self, data):
+        if not self.emulator.measuring:
+            return b''
+        if self.data_ready: # Reading clears the flag until the next sample
+            self._next_sample = monotonic() + self.sample_interval
+        return pack_measurement(self.emulator.measurement(), self.emulator.output_format)
+
+    def _autoclean_interval(self, data):
+        if data:
+            self.emulator.cleaning_interval = struct.unpack('>I', data)[0]
+            return b''
+        return struct.pack('>I', self.emulator.cleaning_interval)
+
+    def _product_type(self, data):
+        return self.emulator.device_info[SUBCMD_ARTICLE_CODE].encode().ljust(
+            i2c.PRODUCT_TYPE_LENGTH, b'\0')
+
+    def _serial_no(self, data):
+        return self.emulator.device_info[SUBCMD_SERIAL_NO].encode().ljust(
+            i2c.SERIAL_NO_LENGTH, b'\0')
+
+    def _reset(self, data):
+        self.emulator.measuring = False
+        return b''
+
+
+class PtyEmulator(object):
+    """
+        Emulated sensor behind a pseudo terminal, open port with pyserial
+        Usage: with PtyEmulator() as emu: Sensirion(port=emu.port)
+    """
+    def __init__(self, emulator=None, latency=0.0, corruption=0.0, drop=0.0, seed=None):
+        self.emulator = emulator or SPS30Emulator(seed=seed)
+        self.latency = latency
+        import tty # pylint: disable=import-outside-toplevel
+        self.faults = FaultInjector(corruption, drop, seed)
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+            Start answering requests in a background thread
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+            Stop the background thread and close the terminal
+        """
+        self._running = False
+        os.close(self._slave)
+        os.close(self._master)
+        self._thread.join(1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self):
+        """
+            Answer requests written to the terminal until stopped
+        """
+        while self._running:
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                return
+            for frame in self.emulator.process(data):
+                frame = self.faults.apply(frame)
+                if frame is None:
+                    continue
+                if self.latency:
+                    sleep(self.latency)
+                try:
+                    os.write(self._master, frame)
+                except OSError:
+                    return
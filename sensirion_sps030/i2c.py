@@ -0,0 +1,349 @@
+"""
+    I2C interface to the Sensirion SPS030
+    The command layer (SensirionI2C) only needs a transport with write(data),
+    read(count) and close(): I2CTransport talks to a Linux /dev/i2c-* device,
+    emulator.FakeI2CBus stands in for it in tests.
+    Every 16 bit word on the bus is followed by a CRC-8 of it.
+"""
+
+import logging
+import os
+import struct
+from time import monotonic, sleep, time
+
+from .retry import DefaultRetryPolicy, RetryBudget
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionException, SensirionFrameException,
+    SensirionTimeoutException)
+from .sensirion_sps030 import (
+    DEFAULT_LOGGING_LEVEL, DEFAULT_READ_DEADLINE, DEFAULT_RETRY_COUNT,
+    OUTPUT_FORMAT_FLOAT, SensirionReading, measurement_struct)
+
+DEFAULT_I2C_BUS = 1
+DEFAULT_I2C_ADDRESS = 0x69
+I2C_SLAVE = 0x0703 # ioctl setting the address of the device to talk to
+
+CRC8_POLYNOMIAL = 0x31
+CRC8_INIT = 0xFF
+
+# Commands are the 16 bit address pointer written first
+CMD_START_MEASUREMENT = 0x0010 # Write
+CMD_STOP_MEASUREMENT = 0x0104 # Execute
+CMD_READ_DATA_READY = 0x0202 # Read
+CMD_READ_MEASUREMENT = 0x0300 # Read
+CMD_READ_WRITE_AUTOCLEAN_INTERVAL = 0x8004 # Read/Write
+CMD_START_FAN_CLEANING = 0x5607 # Execute
+CMD_READ_PRODUCT_TYPE = 0xD002 # Read
+CMD_READ_SERIAL_NO = 0xD033 # Read
+CMD_RESET = 0xD304 # Execute
+
+PRODUCT_TYPE_LENGTH = 8
+SERIAL_NO_LENGTH = 32
+
+# There is no product name over I2C, it follows from the product type
+PRODUCT_NAMES = {
+    "00080000": "SPS30",
+}
+
+# Time the sensor needs to carry out a command before the next one
+COMMAND_DELAYS = {
+    CMD_START_MEASUREMENT: 0.02,
+    CMD_STOP_MEASUREMENT: 0.02,
+    CMD_READ_WRITE_AUTOCLEAN_INTERVAL: 0.02,
+    CMD_START_FAN_CLEANING: 0.005,
+    CMD_RESET: 0.1,
+}
+DATA_READY_POLL_S = 0.1
+DATA_READY_TIMEOUT = 2 # First measurement takes about a second after starting
+
+
+def _crc8_table():
+    """
+        CRC-8 of every byte value, so crc8 needs one lookup per byte
+    """
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            crc = ((crc << 1) ^ CRC8_POLYNOMIAL) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    """
+        Sensirion CRC-8 of a word (polynomial 0x31, initialisation 0xFF)
+    """
+    crc = CRC8_INIT
+    for byte in data:
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def add_crcs(data):
+    """
+        Insert the CRC after every word of data
+    """
+    out = bytearray()
+    for index in range(0, len(data), 2):
+        word = data[index:index + 2]
+        out += word
+        out.append(crc8(word))
+    return bytes(out)
+
+
+def check_crcs(data):
+    """
+        Verify and strip the CRC following every word of data
+    """
+    if len(data) % 3:
+        raise SensirionFrameException("Incomplete word received", "length_failures")
+    out = bytearray()
+    for index in range(0, len(data), 3):
+        word = data[index:index + 2]
+        if crc8(word) != data[index + 2]:
+            raise SensirionFrameException("Checksum error", "checksum_failures")
+        out += word
+    return bytes(out)
+
+
+class I2CTransport(object):
+    """
+        Linux I2C device file talking to one address
+    """
+    def __init__(self, bus=DEFAULT_I2C_BUS, address=DEFAULT_I2C_ADDRESS):
+        import fcntl # pylint: disable=import-outside-toplevel
+        self.path = "/dev/i2c-%d" % bus
+        self.address = address
+        try:
+            self._fd = os.open(self.path, os.O_RDWR)
+        except OSError as exp:
+            raise SensirionConnectionException(str(exp))
+        try:
+            fcntl.ioctl(self._fd, I2C_SLAVE, address)
+        except OSError as exp:
+            os.close(self._fd)
+            raise SensirionConnectionException(str(exp))
+
+    def write(self, data):
+        """
+            Write one message to the device
+        """
+        return os.write(self._fd, data)
+
+    def read(self, count):
+        """
+            Read one message of count bytes from the device
+        """
+        return os.read(self._fd, count)
+
+    def close(self):
+        """
+            Close the device file
+        """
+        os.close(self._fd)
+
+
+class SensirionI2C(object):
+    """
+        Sensirion SPS030 on an I2C bus, with the same API as Sensirion
+    """
+    def __init__(
+            self, bus=DEFAULT_I2C_BUS, address=DEFAULT_I2C_ADDRESS,
+            log_level=DEFAULT_LOGGING_LEVEL, auto_start=True,
+            retries=DEFAULT_RETRY_COUNT, transport=None, retry_policy=None,
+            read_deadline=DEFAULT_READ_DEADLINE, output_format=OUTPUT_FORMAT_FLOAT):
+        """
+            Setup the interface for the sensor
+            transport can be used instead of opening the bus, for example an
+            emulator.FakeI2CBus
+            output_format is OUTPUT_FORMAT_FLOAT or OUTPUT_FORMAT_INTEGER as for Sensirion
+        """
+        self.logger = logging.getLogger("SPS030 Interface")
+        self.logger.setLevel(log_level)
+        self.bus = bus
+        self.address = address
+        self.retries = retries
+        self.retry_policy = retry_policy or DefaultRetryPolicy(max_attempts=retries)
+        self.read_deadline = read_deadline
+        self.output_format = output_format
+        self._measurement_struct = measurement_struct(output_format)
+        self.measurement_running = False
+        self.transport = transport or I2CTransport(bus, address)
+        try:
+            self.reset()
+            if auto_start:
+                self.start_measurement()
+        except BaseException:
+            if transport is None: # Don't leak the bus we opened
+                self.close()
+            raise
+
+    def close(self):
+        """
+            Close the bus
+        """
+        try:
+            self.transport.close()
+        except OSError as exp:
+            self.logger.warning("Error closing bus: %s", exp)
+        self.measurement_running = False
+
+    def _write(self, cmd, data=b''):
+        """
+            Send a command with its arguments and wait for it to complete
+        """
+        try:
+            self.transport.write(struct.pack('>H', cmd) + add_crcs(data))
+        except OSError as exp: # The sensor didn't acknowledge or the bus failed
+            self.logger.error(str(exp))
+            raise SensirionConnectionException(str(exp))
+        delay = COMMAND_DELAYS.get(cmd)
+        if delay:
+            sleep(delay)
+
+    def _read(self, cmd, length):
+        """
+            Read length bytes of data (not counting the CRCs) for a command
+        """
+        self._write(cmd)
+        size = length // 2 * 3
+        try:
+            data = self.transport.read(size)
+        except OSError as exp:
+            self.logger.error(str(exp))
+            raise SensirionConnectionException(str(exp))
+        if len(data) != size:
+            raise SensirionFrameException("Wrong length received", "length_failures")
+        return check_crcs(data)
+
+    def reset(self):
+        """
+            Reset the sensor, it stops measuring
+        """
+        self._write(CMD_RESET)
+        self.measurement_running = False
+
+    def start_measurement(self):
+        """
+            Start the sensor reading data
+        """
+        self._write(CMD_START_MEASUREMENT, self.output_format + b'\0')
+        self.measurement_running = True
+
+    def stop_measurement(self):
+        """
+            Stop the sensor reading data
+        """
+        self._write(CMD_STOP_MEASUREMENT)
+        self.measurement_running = False
+
+    def read_data_ready(self):
+        """
+            True if a new measurement can be read
+        """
+        return self._read(CMD_READ_DATA_READY, 2)[1] == 1
+
+    def read(self):
+        """
+            Wrapper for read_measurement to make it consistent with the other drivers
+        """
+        return self.read_measurement()
+
+    def read_measurement(self):
+        """
+            Read a measurement from the device
+        """
+        payload, epoch = self.read_raw()
+        return SensirionReading.from_payload(payload, epoch, self.output_format)
+
+    def read_raw(self):
+        """
+            Read a measurement without decoding it
+            Returns (payload, epoch) like Sensirion.read_raw()
+        """
+        if not self.measurement_running:
+            self.logger.warning("Measurement not running, starting measurement")
+            self.start_measurement()
+        self._wait_for_data()
+        budget = RetryBudget(self.retry_policy, self.read_deadline, self.logger)
+        while True:
+            try:
+                return self._read(CMD_READ_MEASUREMENT, self._measurement_struct.size), time()
+            except SensirionException as exp:
+                delay = budget.delay(exp)
+                if delay is None:
+                    raise
+                if delay:
+                    sleep(delay)
+
+    def _wait_for_data(self):
+        """
+            Poll the data ready flag until a new measurement is available
+        """
+        deadline = monotonic() + DATA_READY_TIMEOUT
+        while True:
+            try:
+                if self.read_data_ready():
+                    return
+            except SensirionFrameException as exp: # Corrupted flag, ask again
+                self.logger.warning(str(exp))
+            if monotonic() >= deadline:
+                raise SensirionTimeoutException("No new measurement")
+            sleep(DATA_READY_POLL_S)
+
+    def _read_string(self, cmd, length):
+        """
+            Read a null terminated ASCII string
+        """
+        return self._read(cmd, length).split(b'\0', 1)[0].decode()
+
+    def get_product_type(self):
+        """
+            Get the product type, "00080000" for the SPS30
+        """
+        return self._read_string(CMD_READ_PRODUCT_TYPE, PRODUCT_TYPE_LENGTH)
+
+    def get_product_name(self):
+        """
+            Get the product name string, looked up from the product type
+        """
+        product_type = self.get_product_type()
+        try:
+            return PRODUCT_NAMES[product_type]
+        except KeyError:
+            raise SensirionException("Unknown product type %s" % product_type)
+
+    def get_article_code(self):
+        """
+            Get the article code, over I2C this is the product type
+        """
+        return self.get_product_type()
+
+    def get_serial_no(self):
+        """
+            Get the serial number
+        """
+        return self._read_string(CMD_READ_SERIAL_NO, SERIAL_NO_LENGTH)
+
+    def read_cleaning_interval(self):
+        """
+            Read the cleaning interval from the sensor
+        """
+        return struct.unpack('>I', self._read(CMD_READ_WRITE_AUTOCLEAN_INTERVAL, 4))[0]
+
+    def write_cleaning_interval(self, interval):
+        """
+            Sets the interval at which the fan should be cleaned
+        """
+        if interval > 0xFFFFFFFF:
+            raise SensirionException("Interval too large")
+        self._write(CMD_READ_WRITE_AUTOCLEAN_INTERVAL, struct.pack('>I', interval))
+
+    def start_fan_clean(self):
+        """
+            Manually start a cleaning of the fan
+        """
+        self._write(CMD_START_FAN_CLEANING)
@@ -0,0 +1,116 @@
+"""
+    Optional latency and error instrumentation for the Sensirion interface
+"""
+
+from bisect import bisect_left
+
+from .sensirion_exception import (
+    SensirionDeviceException, SensirionFrameException, SensirionNoDataException,
+    SensirionTimeoutException)
+
+PHASES = ("tx", "rx", "unstuff", "checksum", "decode")
+COUNTERS = (
+    "bytes_in", "bytes_out", "retries", "timeouts", "error_responses",
+    "checksum_failures", "length_failures", "wrong_address", "wrong_command",
+    "escape_failures", "empty_measurements")
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # Seconds
+
+
+class Histogram(object):
+    """
+        Cumulative histogram of durations in the style of Prometheus
+    """
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+            Record a single duration
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """
+            Cumulative bucket counts keyed by upper bound
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class Metrics(object):
+    """
+        Per-phase histograms and error counters for one sensor
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.histograms = {phase: Histogram(buckets) for phase in PHASES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, phase, seconds):
+        """
+            Record how long a phase of a read cycle took
+        """
+        self.histograms[phase].observe(seconds)
+
+    def increment(self, counter, amount=1):
+        """
+            Increase a counter
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def count_exception(self, exp):
+        """
+            Increase the counter matching a SensirionException subclass
+        """
+        if isinstance(exp, SensirionFrameException):
+            self.increment(exp.reason)
+        elif isinstance(exp, SensirionDeviceException):
+            self.increment("error_responses")
+        elif isinstance(exp, SensirionTimeoutException):
+            self.increment("timeouts")
+        elif isinstance(exp, SensirionNoDataException):
+            self.increment("empty_measurements")
+
+    def snapshot(self):
+        """
+            Plain dict copy of the current values
+        """
+        return {
+            "counters": dict(self.counters),
+            "phases": {phase: hist.snapshot() for phase, hist in self.histograms.items()},
+        }
+
+    def to_prometheus(self, prefix="sps030", labels=None):
+        """
+            Render the metrics in the Prometheus text exposition format
+        """
+        label_str = ",".join('%s="%s"' % item for item in sorted((labels or {}).items()))
+        lines = []
+        for counter, value in sorted(self.counters.items()):
+            name = "%s_%s_total" % (prefix, counter)
+            lines.append("# TYPE %s counter" % name)
+            lines.append("%s%s %d" % (name, "{%s}" % label_str if label_str else "", value))
+        name = "%s_phase_seconds" % prefix
+        lines.append("# TYPE %s histogram" % name)
+        for phase, hist in self.histograms.items():
+            phase_labels = 'phase="%s"' % phase
+            if label_str:
+                phase_labels = label_str + "," + phase_labels
+            for bound, count in hist.snapshot()["buckets"].items():
+                lines.append('%s_bucket{%s,le="%s"} %d' % (
+                    name, phase_labels, "+Inf" if bound == float("inf") else repr(bound), count))
+            lines.append("%s_sum{%s} %r" % (name, phase_labels, hist.sum))
+            lines.append("%s_count{%s} %d" % (name, phase_labels, hist.count))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,263 @@
+"""
+    Drive many SPS030 sensors from a single thread
+    Each sensor runs a small state machine (reset -> start -> read loop) and
+    the serial ports are multiplexed with selectors rather than blocking
+"""
+
+import logging
+import selectors
+from time import monotonic, sleep, time
+
+from serial import Serial, SerialException
+
+from . import shdlc
+from .sensirion_exception import (
+    SensirionException, SensirionFrameException, SensirionNoDataException,
+    SensirionTimeoutException)
+from .sensirion_sps030 import (
+    CMD_ADDR, CMD_READ_MEASUREMENT, CMD_RESET, CMD_START_MEASUREMENT,
+    DEFAULT_BAUD_RATE, DEFAULT_READ_TIMEOUT, MIN_SAMPLE_INTERVAL, RETRY_SLEEP,
+    RESET_DELAY_S, response_timeout,
+    OUTPUT_FORMAT_FLOAT, SUBCMD_START_MEASUREMENT_1, SensirionReading, check_measurement_length,
+    measurement_struct)
+
+STATE_CLOSED = "closed"
+STATE_RESET = "reset"
+STATE_START = "start"
+STATE_READING = "reading"
+STATE_BACKOFF = "backoff"
+
+MAX_READ_FAILURES = 3 # Failed reads in a row before the sensor is brought up again
+
+
+class PooledSensor(object):
+    """
+        State of one sensor driven by a SensorPool
+    """
+    def __init__(self, port, callback, serial=None):
+        self.port = port
+        self.callback = callback
+        self.serial = serial
+        self.reader = shdlc.FrameReader()
+        self.state = STATE_CLOSED
+        self.pending = None # Command we are waiting on a response to
+        self.deadline = None # When the pending command times out
+        self.next_read = None # Next tick to request a measurement on
+        self.retry_at = 0
+        self.readings = 0
+        self.errors = 0
+        self.failures = 0 # Failed reads since the last good one
+
+    def wakeup(self):
+        """
+            The next time this sensor needs attention, None if only I/O will do
+        """
+        if self.state == STATE_BACKOFF:
+            return self.retry_at
+        if self.pending is not None:
+            return self.deadline
+        return self.next_read
+
+
+class SensorPool(object):
+    """
+        Samples a set of sensors from one thread
+        Readings are passed to callback(port, reading) as they arrive
+    """
+    def __init__(
+            self, interval=MIN_SAMPLE_INTERVAL, baud=DEFAULT_BAUD_RATE,
+            response_timeout=DEFAULT_READ_TIMEOUT, retry_sleep=RETRY_SLEEP,
+            logger=None, output_format=OUTPUT_FORMAT_FLOAT):
+        if interval < MIN_SAMPLE_INTERVAL:
+            raise SensirionException("Interval shorter than %ss" % MIN_SAMPLE_INTERVAL)
+        self.logger = logger or logging.getLogger("SPS030 Interface")
+        self.interval = interval
+        self.baud = baud
+        self.response_timeout = response_timeout
+        self.retry_sleep = retry_sleep
+        self.output_format = output_format
+        self._measurement_struct = measurement_struct(output_format)
+        self.sensors = {}
+        self._selector = selectors.DefaultSelector()
+
+    def add(self, port, callback, serial=None):
+        """
+            Add a sensor to the pool, it is opened and reset on the next poll
+            An already open serial-like object with a fileno() can be given
+        """
+        if port in self.sensors:
+            raise SensirionException("%s already in pool" % port)
+        self.sensors[port] = PooledSensor(port, callback, serial)
+
+    def remove(self, port):
+        """
+            Stop sampling a sensor and close its port
+        """
+        self._close(self.sensors.pop(port))
+
+    def close(self):
+        """
+            Close every port in the pool
+        """
+        for sensor in self.sensors.values():
+            self._close(sensor)
+        self.sensors.clear()
+        self._selector.close()
+
+    def run(self, duration=None):
+        """
+            Poll the sensors until duration seconds have passed (forever if None)
+        """
+        end = None if duration is None else monotonic() + duration
+        while end is None or monotonic() < end:
+            self.poll(None if end is None else end - monotonic())
+
+    def poll(self, timeout=None):
+        """
+            Wait for at most timeout seconds for something to do and do it
+        """
+        now = monotonic()
+        for sensor in list(self.sensors.values()):
+            self._service(sensor, now)
+        wakeups = [
+            when for when in (sensor.wakeup() for sensor in self.sensors.values())
+            if when is not None]
+        wait = max(0, min(wakeups) - monotonic()) if wakeups else timeout
+        if timeout is not None and wait is not None:
+            wait = min(wait, max(0, timeout))
+        if not self._selector.get_map():
+            if wait:
+                sleep(wait)
+            return
+        for key, _ in self._selector.select(wait):
+            self._receive(key.data)
+
+    def _service(self, sensor, now):
+        """
+            Handle timeouts, back-off and measurement ticks
+        """
+        if sensor.state == STATE_CLOSED:
+            self._open(sensor, now)
+        elif sensor.state == STATE_BACKOFF:
+            if now >= sensor.retry_at:
+                self._open(sensor, now)
+        elif sensor.pending is not None:
+            if now >= sensor.deadline:
+                self._fail(sensor, SensirionTimeoutException("Message incomplete"), now)
+        elif sensor.state == STATE_START and now >= sensor.next_read:
+            self._send(
+                sensor, CMD_START_MEASUREMENT,
+                SUBCMD_START_MEASUREMENT_1 + self.output_format, now)
+        elif sensor.state == STATE_READING and now >= sensor.next_read:
+            # Stay on the tick grid, skipping ticks we have already missed
+            missed = int((now - sensor.next_read) // self.interval)
+            if missed:
+                self.logger.warning("%s: skipped %d readings", sensor.port, missed)
+            sensor.next_read += (missed + 1) * self.interval
+            self._send(sensor, CMD_READ_MEASUREMENT, b'', now)
+
+    def _open(self, sensor, now):
+        """
+            Open the port if needed and start the bring-up sequence
+        """
+        try:
+            if sensor.serial is None:
+                sensor.serial = Serial(port=sensor.port, baudrate=self.baud, timeout=0)
+            if sensor.serial.fileno() not in self._selector.get_map():
+                self._selector.register(sensor.serial.fileno(), selectors.EVENT_READ, sensor)
+        except (SerialException, OSError) as exp:
+            self._fail(sensor, exp, now)
+            return
+        sensor.state = STATE_RESET
+        self._send(sensor, CMD_RESET, b'', now)
+
+    def _send(self, sensor, cmd, data, now):
+        """
+            Write a command and start waiting for the response
+        """
+        sensor.reader.reset() # Drop anything left over from an earlier command
+        try:
+            sensor.serial.write(shdlc.build_frame(CMD_ADDR, cmd, data))
+        except (SerialException, OSError) as exp:
+            self._fail(sensor, exp, now)
+            return
+        sensor.pending = cmd
+        sensor.deadline = now + response_timeout(cmd, self.response_timeout)
+
+    def _receive(self, sensor):
+        """
+            Read whatever the port has waiting and handle complete frames
+        """
+        now = monotonic()
+        try:
+            data = sensor.serial.read(sensor.serial.in_waiting or 1)
+        except (SerialException, OSError) as exp:
+            self._fail(sensor, exp, now)
+            return
+        sensor.reader.feed(data)
+        frame = sensor.reader.next_frame()
+        while frame is not None and sensor.pending is not None:
+            try:
+                self._handle(sensor, frame, now)
+            except SensirionException as exp:
+                self._fail(sensor, exp, now)
+                return
+            frame = sensor.reader.next_frame()
+
+    def _handle(self, sensor, frame, now):
+        """
+            Advance the state machine with a response from the sensor
+        """
+        recv = shdlc.decode_response(frame, CMD_ADDR, sensor.pending, self.logger)
+        sensor.pending = None
+        if sensor.state == STATE_RESET:
+            sensor.state = STATE_START
+            sensor.next_read = now + RESET_DELAY_S # Start once it has restarted
+        elif sensor.state == STATE_START:
+            sensor.state = STATE_READING
+            sensor.next_read = now + self.interval # First reading ready after 1s
+        else:
+            check_measurement_length(recv, self.output_format, self.logger)
+            reading = SensirionReading(recv, time(), self.output_format)
+            sensor.readings += 1
+            sensor.failures = 0
+            sensor.callback(sensor.port, reading)
+
+    def _fail(self, sensor, exp, now):
+        """
+            Log a failure and go back to resetting the sensor after a pause
+            A corrupt, late or missing measurement is just read again on the
+            next tick unless it keeps happening
+        """
+        self.logger.error("%s: %s", sensor.port, exp)
+        sensor.errors += 1
+        sensor.pending = None
+        if (sensor.state == STATE_READING
+                and isinstance(exp, (
+                    SensirionFrameException, SensirionNoDataException, SensirionTimeoutException))):
+            sensor.failures += 1
+            if sensor.failures < MAX_READ_FAILURES:
+                sensor.reader.reset()
+                return
+        sensor.failures = 0
+        if isinstance(exp, (SerialException, OSError)):
+            self._close(sensor)
+        sensor.state = STATE_BACKOFF
+        sensor.retry_at = now + self.retry_sleep
+
+    def _close(self, sensor):
+        """
+            Unregister and close a sensor's port
+        """
+        if sensor.serial is None:
+            return
+        try:
+            self._selector.unregister(sensor.serial.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+        try:
+            sensor.serial.close()
+        except (SerialException, OSError):
+            pass
+        sensor.serial = None
+        sensor.state = STATE_CLOSED
@@ -0,0 +1,110 @@
+"""
+    Retry policies for failed measurement reads
+    A policy looks at what went wrong and decides whether to try again and
+    after how long, the caller caps the total time with a deadline.
+"""
+
+import random
+from time import monotonic
+
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionDeviceException, SensirionFrameException,
+    SensirionNoDataException, SensirionTimeoutException)
+
+DEFAULT_BACKOFF_BASE = 0.05 # First timeout back-off (seconds)
+DEFAULT_BACKOFF_CAP = 1 # Longest single back-off (seconds)
+DEFAULT_NO_DATA_POLL = 0.1 # Wait before asking again for a measurement that isn't ready
+
+
+class RetryPolicy(object):
+    """
+        Base class, never retries
+    """
+    def delay(self, exp, attempt):
+        """
+            Seconds to wait before retrying after attempt number attempt
+            (starting at 1) failed with exp, or None to give up
+        """
+        return None
+
+
+class DefaultRetryPolicy(RetryPolicy):
+    """
+        Retries depending on the failure:
+        - corrupted frames (checksum, length, escapes, wrong command) are
+          retried straight away, the next frame is usually fine
+        - a measurement that isn't ready yet is asked for again every
+          no_data_poll seconds, only the read deadline limits these
+        - timeouts back off exponentially with full jitter
+        - error codes from the sensor and lost connections aren't retried,
+          asking again won't change the answer
+    """
+    def __init__(
+            self, max_attempts=None, base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_CAP,
+            rng=None, no_data_poll=DEFAULT_NO_DATA_POLL):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+        self.no_data_poll = no_data_poll
+        self._random = rng or random.Random()
+
+    def delay(self, exp, attempt):
+        if isinstance(exp, SensirionNoDataException):
+            return self.no_data_poll
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+        if isinstance(exp, (SensirionDeviceException, SensirionConnectionException)):
+            return None
+        if isinstance(exp, SensirionFrameException):
+            return 0
+        if isinstance(exp, SensirionTimeoutException):
+            return self._random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+        return self.base # Anything else
+
+
+class FixedRetryPolicy(RetryPolicy):
+    """
+        The original behaviour: the same pause whatever went wrong
+    """
+    def __init__(self, max_attempts, sleep):
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+
+    def delay(self, exp, attempt):
+        if attempt >= self.max_attempts or isinstance(exp, SensirionConnectionException):
+            return None
+        return self.sleep
+
+
+class RetryBudget(object):
+    """
+        Attempts and deadline of one retried read, shared by the drivers
+        Usage:
+            budget = RetryBudget(policy, read_deadline, logger)
+            while True:
+                try:
+                    return read()
+                except SensirionException as exp:
+                    delay = budget.delay(exp)
+                    if delay is None:
+                        raise
+                    sleep(delay)
+    """
+    def __init__(self, policy, read_deadline, logger):
+        self.policy = policy
+        self.deadline = monotonic() + read_deadline
+        self.logger = logger
+        self.attempt = 1
+
+    def delay(self, exp):
+        """
+            Log a failed attempt and return how long to wait before the next,
+            None if the policy gives up or the wait would pass the deadline
+        """
+        self.logger.warning("Attempt %d failed", self.attempt)
+        self.logger.error(str(exp))
+        delay = self.policy.delay(exp, self.attempt)
+        if delay is None or monotonic() + delay >= self.deadline:
+            return None
+        self.attempt += 1
+        return delay
@@ -0,0 +1,206 @@
+"""
+    Compact binary ring log of readings
+    Each sensor gets a fixed size memory mapped file of fixed width records
+    (epoch float64 followed by the ten measurements as float32), once full
+    the oldest readings are overwritten. The file can be read back as a
+    NumPy array without copying.
+"""
+
+import mmap
+import os
+import struct
+
+from .sensirion_exception import SensirionException
+from .sensirion_sps030 import MEASUREMENT_FIELDS
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover - depends on the environment
+    np = None
+
+MAGIC = b'SPS30LOG'
+VERSION = 1
+FLAG_RAW_FRAMES = 0x0001
+
+HEADER = struct.Struct('<8sHHIQQ') # magic, version, flags, record size, capacity, written
+HEADER_SIZE = 64 # Header padded to keep the records aligned
+WRITTEN_OFFSET = 24 # Offset of the count of records written in the header
+
+RECORD = struct.Struct('<d10f')
+RAW_SLOT = 64 # Length byte followed by up to 63 bytes of unstuffed frame
+RAW_MAX = RAW_SLOT - 1
+
+DEFAULT_CAPACITY = 86400 # One day at 1Hz
+
+
+def record_dtype(raw_frames=False):
+    """
+        NumPy dtype matching a record on disk
+    """
+    fields = [("epoch", "<f8")] + [(field, "<f4") for field in MEASUREMENT_FIELDS]
+    if raw_frames:
+        fields += [("raw_length", "u1"), ("raw", "u1", (RAW_MAX,))]
+    return np.dtype(fields)
+
+
+class _RingFile(object):
+    """
+        Header handling shared by the recorder and the reader
+    """
+    def _read_header(self):
+        """
+            Check the file is a reading log and load its layout
+        """
+        magic, version, flags, record_size, capacity, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SensirionException("%s is not a reading log" % self.path)
+        self.raw_frames = bool(flags & FLAG_RAW_FRAMES)
+        self.record_size = record_size
+        self.capacity = capacity
+
+    @property
+    def written(self):
+        """
+            Total number of records ever written, including overwritten ones
+        """
+        return struct.unpack_from('<Q', self._map, WRITTEN_OFFSET)[0]
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def close(self):
+        """
+            Unmap and close the file
+            NumPy views of the records stay valid: while any is alive the
+            mapping is left to be released once the last one is gone
+        """
+        try:
+            self._map.close()
+        except BufferError: # Exported views still exist
+            pass
+        self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReadingRecorder(_RingFile):
+    """
+        Appends readings to a ring log file, creating it if needed
+        An existing file must have been created with the same capacity and
+        raw_frames
+    """
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, raw_frames=False):
+        self.path = path
+        record_size = RECORD.size + (RAW_SLOT if raw_frames else 0)
+        if not os.path.exists(path):
+            with open(path, "wb") as log_file:
+                log_file.write(HEADER.pack(
+                    MAGIC, VERSION, FLAG_RAW_FRAMES if raw_frames else 0,
+                    record_size, capacity, 0).ljust(HEADER_SIZE, b'\0'))
+                log_file.truncate(HEADER_SIZE + record_size * capacity)
+        self._file = open(path, "r+b")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            self._read_header()
+            if self.capacity != capacity or self.raw_frames != raw_frames:
+                raise SensirionException(
+                    "%s holds %d records%s, not %d%s" % (
+                        path, self.capacity, " with raw frames" if self.raw_frames else "",
+                        capacity, " with raw frames" if raw_frames else ""))
+        except BaseException:
+            self._file.close()
+            raise
+
+    def append(self, reading, frame=None):
+        """
+            Write a reading, and the unstuffed frame it came from if the log
+            keeps raw frames
+        """
+        written = self.written
+        offset = HEADER_SIZE + (written % self.capacity) * self.record_size
+        RECORD.pack_into(
+            self._map, offset, reading.epoch,
+            *[getattr(reading, field) for field in MEASUREMENT_FIELDS])
+        if self.raw_frames:
+            frame = frame or b''
+            if len(frame) > RAW_MAX:
+                raise SensirionException("Frame too long to log")
+            offset += RECORD.size
+            self._map[offset] = len(frame)
+            self._map[offset + 1:offset + 1 + len(frame)] = frame
+        # Only count the record once it is complete
+        struct.pack_into('<Q', self._map, WRITTEN_OFFSET, written + 1)
+
+    def flush(self):
+        """
+            Make sure everything written has reached the disk
+        """
+        self._map.flush()
+
+
+class ReadingLog(_RingFile):
+    """
+        Read only access to a ring log file
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._read_header()
+
+    def _offset(self, index):
+        """
+            Position of a slot in the file
+        """
+        return HEADER_SIZE + index * self.record_size
+
+    def __iter__(self):
+        """
+            Yield (epoch, values, raw frame or None) from oldest to newest
+        """
+        written = self.written
+        for count in range(max(0, written - self.capacity), written):
+            offset = self._offset(count % self.capacity)
+            record = RECORD.unpack_from(self._map, offset)
+            raw = None
+            if self.raw_frames:
+                length = self._map[offset + RECORD.size]
+                raw = self._map[offset + RECORD.size + 1:offset + RECORD.size + 1 + length]
+            yield record[0], record[1:], raw
+
+    def records(self):
+        """
+            Zero-copy NumPy view of the whole ring in storage order
+            Slots not written yet are zero
+        """
+        if np is None:
+            raise SensirionException("NumPy is required for array access")
+        return np.frombuffer(
+            self._map, dtype=record_dtype(self.raw_frames),
+            count=self.capacity, offset=HEADER_SIZE)
+
+    def views(self):
+        """
+            Zero-copy views (older, newer) that together hold the records in
+            chronological order, older is empty until the ring has wrapped
+        """
+        records = self.records()
+        written = self.written
+        if written <= self.capacity:
+            return records[:0], records[:written]
+        split = written % self.capacity
+        return records[split:], records[:split]
+
+    def array(self):
+        """
+            Records in chronological order, only copies once the ring has wrapped
+        """
+        older, newer = self.views()
+        if not len(older): # pylint: disable=len-as-condition
+            return newer
+        return np.concatenate((older, newer))
@@ -0,0 +1,49 @@
+"""
+    Exceptions raised by the Sensirion SPS030 interface
+"""
+
+class SensirionException(Exception):
+    """
+        Exception to be thrown if any problems occur
+    """
+    pass
+
+
+class SensirionTimeoutException(SensirionException):
+    """
+        No complete response arrived from the sensor in time
+    """
+    pass
+
+
+class SensirionFrameException(SensirionException):
+    """
+        A response arrived but was corrupted or not the one expected
+        reason names what was wrong with it, e.g. "checksum_failures"
+    """
+    def __init__(self, message, reason):
+        super(SensirionFrameException, self).__init__(message)
+        self.reason = reason
+
+
+class SensirionDeviceException(SensirionException):
+    """
+        The sensor answered with an error code in the state byte
+    """
+    def __init__(self, message, code):
+        super(SensirionDeviceException, self).__init__(message)
+        self.code = code
+
+
+class SensirionNoDataException(SensirionException):
+    """
+        The sensor answered but had no new measurement yet
+    """
+    pass
+
+
+class SensirionConnectionException(SensirionException):
+    """
+        The serial port couldn't be opened or has gone away
+    """
+    pass
@@ -7,21 +7,29 @@
 
 import logging
 import struct
-from datetime import datetime, timedelta
-from time import sleep
+from datetime import datetime
+from time import monotonic, perf_counter, sleep, time
 from serial import Serial, SerialException
 
-from .sensirion_error_codes import ERROR_CODE_NO_ERROR, lookup_error_code
+from . import byte_stuffing
+from . import shdlc
+from .device_cache import DeviceInfoCache
+from .metrics import Metrics
+from .retry import DefaultRetryPolicy, RetryBudget
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionException, SensirionFrameException,
+    SensirionNoDataException)
+from .shdlc import FrameReader, MSG_START_STOP, TRACE_RX, TRACE_TX
 
 DEFAULT_SERIAL_PORT = "/dev/ttyUSB0" # Serial port to use if no other specified
 DEFAULT_BAUD_RATE = 115200 # Serial baud rate to use if no other specified
 DEFAULT_SERIAL_TIMEOUT = 2 # Serial timeout to use if not specified
-DEFAULT_READ_TIMEOUT = 1 #How long to sit looking for the correct character sequence.
+DEFAULT_READ_TIMEOUT = None #How long to wait for a response, None uses COMMAND_TIMEOUTS
 
 DEFAULT_LOGGING_LEVEL = logging.WARN
 DEFAULT_RETRY_COUNT = 3
+DEFAULT_READ_DEADLINE = 1 # Most time read_measurement spends retrying (seconds)
 RETRY_SLEEP = 2
-MSG_START_STOP = b'\x7e'
 
 CMD_ADDR = b'\x00'
 CMD_START_MEASUREMENT = b'\x00' #Execute
@@ -34,7 +42,9 @@ CMD_RESET = b'\xd3' #Execute
 
 
 SUBCMD_START_MEASUREMENT_1 = b'\x01'
-SUBCMD_START_MEASUREMENT_2 = b'\x03'
+OUTPUT_FORMAT_FLOAT = b'\x03' # Big-endian IEEE754 floats
+OUTPUT_FORMAT_INTEGER = b'\x05' # Unsigned 16 bit integers, typical particle size in nm
+SUBCMD_START_MEASUREMENT_2 = OUTPUT_FORMAT_FLOAT
 
 SUBCMD_DEVICE_NAME = b'\x01'
 SUBCMD_ARTICLE_CODE = b'\x02'
@@ -43,32 +53,127 @@ SUBCMD_SERIAL_NO = b'\x03'
 SUBCMD_READ_INTERVAL = b'\x00'
 SUBCMD_WRITE_INTERVAL = b'\x00'
 
-RX_DELAY_S = 0.02 # How long to wait between sending the read command and getting data (seconds)
+RX_DELAY_S = 0.02 # Datasheet response time for most commands (seconds)
+RESET_DELAY_S = 0.05 # Time given to the sensor to restart after acknowledging a reset
+
+# Longest we wait for the whole response frame to each command, from sending
+# it to the closing 0x7E. Replies are processed as soon as they are complete
+# so these only matter on failure
+DEFAULT_COMMAND_TIMEOUT = 0.1
+COMMAND_TIMEOUTS = {
+    CMD_START_MEASUREMENT: 0.5,
+    CMD_STOP_MEASUREMENT: 0.5,
+    CMD_READ_MEASUREMENT: DEFAULT_COMMAND_TIMEOUT,
+    CMD_READ_WRITE_AUTOCLEAN_INTERVAL: DEFAULT_COMMAND_TIMEOUT,
+    CMD_START_FAN_CLEANING: DEFAULT_COMMAND_TIMEOUT,
+    CMD_DEVICE_INFORMATION: DEFAULT_COMMAND_TIMEOUT,
+    CMD_RESET: 0.5,
+}
 
 MIN_SAMPLE_INTERVAL = 1
 
+MEASUREMENT_FIELDS = (
+    "pm1", "pm25", "pm4", "pm10", "n05", "n1", "n25", "n4", "n10", "tps")
+MEASUREMENT_STRUCTS = { # Payload of a read measurement response
+    OUTPUT_FORMAT_FLOAT: struct.Struct('>10f'),
+    OUTPUT_FORMAT_INTEGER: struct.Struct('>10H'),
+}
+MEASUREMENT_STRUCT = MEASUREMENT_STRUCTS[OUTPUT_FORMAT_FLOAT]
+MEASUREMENT_OFFSET = 5 # Payload starts after 0x7E ADDR CMD STATE LEN
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def measurement_struct(output_format):
+    """
+        Struct decoding a measurement in the given output format
+    """
+    try:
+        return MEASUREMENT_STRUCTS[output_format]
+    except KeyError:
+        raise SensirionException("Unknown output format %r" % output_format)
+
+
+def check_measurement_length(recv, output_format, logger):
+    """
+        Verify that an unstuffed measurement response has the payload size of
+        output_format
+    """
+    size = measurement_struct(output_format).size
+    if recv[4] == size:
+        return
+    if recv[4] == 0:
+        raise SensirionNoDataException("No new measurement")
+    logger.error("Measurement of %d bytes, was expecting %d", recv[4], size)
+    raise SensirionFrameException("Wrong measurement length", "length_failures")
+
+
+def response_timeout(cmd, read_timeout=None):
+    """
+        How long to wait for the response to cmd, read_timeout overrides the
+        per-command budget if it is set
+    """
+    if read_timeout is not None:
+        return read_timeout
+    return COMMAND_TIMEOUTS.get(cmd, DEFAULT_COMMAND_TIMEOUT)
+
+
 class SensirionReading(object):
     """
         Describes a single reading from the Sensirion sensor
     """
-    def __init__(self, line):
+    __slots__ = ("epoch", "_line", "_offset", "_struct") + MEASUREMENT_FIELDS
+
+    def __init__(self, line, epoch=None, output_format=OUTPUT_FORMAT_FLOAT):
         """
             Takes a line from the Sensirion serial port and converts it into
             an object containing the data
+            The values are only decoded the first time one is accessed, at
+            full precision (floats) or as reported (integers)
         """
-        if len(line) < 46:
+        self._struct = measurement_struct(output_format)
+        if len(line) < MEASUREMENT_OFFSET + self._struct.size + 1:
             raise SensirionException("Data too short to parse")
-        self.timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self.pm1 = round(struct.unpack('>f', line[5:9])[0], 1)
-        self.pm25 = round(struct.unpack('>f', line[9:13])[0], 1)
-        self.pm4 = round(struct.unpack('>f', line[13:17])[0], 1)
-        self.pm10 = round(struct.unpack('>f', line[17:21])[0], 1)
-        self.n05 = round(struct.unpack('>f', line[21:25])[0], 1)
-        self.n1 = round(struct.unpack('>f', line[25:29])[0], 1)
-        self.n25 = round(struct.unpack('>f', line[29:33])[0], 1)
-        self.n4 = round(struct.unpack('>f', line[33:37])[0], 1)
-        self.n10 = round(struct.unpack('>f', line[37:41])[0], 1)
-        self.tps = round(struct.unpack('>f', line[41:45])[0], 1)
+        self.epoch = time() if epoch is None else epoch
+        self._line = line
+        self._offset = MEASUREMENT_OFFSET
+
+    @classmethod
+    def from_payload(cls, payload, epoch=None, output_format=OUTPUT_FORMAT_FLOAT):
+        """
+            Reading from the data bytes returned by Sensirion.read_raw()
+        """
+        reading = cls.__new__(cls)
+        reading._struct = measurement_struct(output_format)
+        if len(payload) < reading._struct.size:
+            raise SensirionException("Data too short to parse")
+        reading.epoch = time() if epoch is None else epoch
+        reading._line = payload
+        reading._offset = 0
+        return reading
+
+    @property
+    def payload(self):
+        """
+            The undecoded data bytes
+        """
+        return memoryview(self._line)[self._offset:self._offset + self._struct.size]
+
+    def __getattr__(self, name):
+        """
+            Decode every value on first access, later accesses hit the slots
+        """
+        if name not in MEASUREMENT_FIELDS:
+            raise AttributeError(name)
+        (self.pm1, self.pm25, self.pm4, self.pm10, self.n05,
+         self.n1, self.n25, self.n4, self.n10, self.tps) = self._struct.unpack_from(
+             self._line, self._offset)
+        return object.__getattribute__(self, name)
+
+    @property
+    def timestamp(self):
+        """
+            UTC time the reading was taken, only formatted when asked for
+        """
+        return datetime.utcfromtimestamp(self.epoch).strftime(TIMESTAMP_FORMAT)
 
     def __str__(self):
         return (
@@ -78,12 +183,6 @@ class SensirionReading(object):
              self.n1, self.n25, self.n4,
              self.n10, self.tps))
 
-class SensirionException(Exception):
-    """
-        Exception to be thrown if any problems occur
-    """
-    pass
-
 class Sensirion(object):
     """
         Actual interface to the Sensirion SPS030 sensor
@@ -93,13 +192,26 @@ class Sensirion(object):
             serial_timeout=DEFAULT_SERIAL_TIMEOUT,
             read_timeout=DEFAULT_READ_TIMEOUT,
             log_level=DEFAULT_LOGGING_LEVEL,
-            auto_start=True, retries=DEFAULT_RETRY_COUNT):
+            auto_start=True, retries=DEFAULT_RETRY_COUNT, metrics=None, serial=None,
+            info_cache=None, retry_policy=None, read_deadline=DEFAULT_READ_DEADLINE,
+            frame_trace=None, output_format=OUTPUT_FORMAT_FLOAT):
         """
             Setup the interface for the sensor
+            serial can be an already open serial-like object (for example an
+            emulator.LoopbackSerial) to use instead of opening port
+            info_cache can be a file name or DeviceInfoCache to keep the device
+            information and cleaning interval across restarts
+            retry_policy decides how failed reads are retried, by default a
+            retry.DefaultRetryPolicy making at most retries attempts, and
+            read_deadline caps the time spent on one read including retries
+            metrics can be True or a Metrics instance to record how long each
+            phase of a command takes and count errors, see snapshot_metrics()
+            frame_trace is called with (TRACE_TX or TRACE_RX, frame) for every
+            stuffed frame sent or received, e.g. shdlc.log_frames()
+            output_format selects float (OUTPUT_FORMAT_FLOAT) or 16 bit
+            integer (OUTPUT_FORMAT_INTEGER) measurements
         """
         self.logger = logging.getLogger("SPS030 Interface")
-        logging.basicConfig(
-            format='%(asctime)s - %(name)s - %(lineno)d - %(levelname)s - %(message)s')
         self.logger.setLevel(log_level)
         self.port = port
         self.logger.info("Serial port: %s", self.port)
@@ -111,19 +223,54 @@ class Sensirion(object):
         self.logger.info("Read Timeout: %s", self.read_timeout)
         self.retries = retries
         self.logger.info("Retries: %d", self.retries)
+        self.retry_policy = retry_policy or DefaultRetryPolicy(max_attempts=retries)
+        self.read_deadline = read_deadline
+        self.frame_trace = frame_trace
+        self.output_format = output_format
+        self._measurement_struct = measurement_struct(output_format)
         self.measurement_running = False
         self.last_measurement = None
+        self.skipped_ticks = 0
+        self.metrics = Metrics() if metrics is True else (metrics or None)
+        if isinstance(info_cache, str):
+            info_cache = DeviceInfoCache(info_cache)
+        self.info_cache = info_cache
+        self._info = {} # Device information read since the last reset
+        self._reader = FrameReader(self.logger)
+        if serial is not None:
+            self.serial = serial
+        else:
+            try:
+                self.serial = Serial(
+                    port=self.port, baudrate=self.baud,
+                    timeout=self.serial_timeout)
+                self.logger.debug("Port Opened Successfully")
+            except SerialException as exp:
+                self.logger.error(str(exp))
+                raise SensirionConnectionException(str(exp))
         try:
-            self.serial = Serial(
-                port=self.port, baudrate=self.baud,
-                timeout=self.serial_timeout)
-            self.logger.debug("Port Opened Successfully")
-        except SerialException as exp:
-            self.logger.error(str(exp))
-            raise SensirionException(str(exp))
-        self.reset()
-        if auto_start:
-            self.start_measurement()
+            try:
+                self.serial.reset_input_buffer() # Drop anything left over from before
+            except OSError as exp:
+                raise SensirionConnectionException(str(exp))
+            self.reset()
+            if auto_start:
+                self.start_measurement()
+        except BaseException:
+            if serial is None: # Don't leak the port we opened
+                self.close()
+            raise
+
+    def close(self):
+        """
+            Close the serial port
+        """
+        try:
+            self.serial.close()
+        except OSError as exp:
+            self.logger.warning("Error closing port: %s", exp)
+        self.measurement_running = False
+        self.invalidate_cache()
 
     def set_log_level(self, log_level):
         """
@@ -131,32 +278,55 @@ class Sensirion(object):
         """
         self.logger.setLevel(log_level)
 
+    def transaction(self):
+        """
+            Queue several commands and send them to the sensor together
+            See transaction.Transaction
+        """
+        from .transaction import Transaction # pylint: disable=import-outside-toplevel
+        return Transaction(self)
+
+    def snapshot_metrics(self):
+        """
+            Copy of the instrumentation counters and histograms as a dict
+        """
+        if self.metrics is None:
+            raise SensirionException("Metrics not enabled")
+        return self.metrics.snapshot()
+
+    def prometheus_metrics(self, prefix="sps030"):
+        """
+            Instrumentation in the Prometheus text format labelled with the port
+        """
+        if self.metrics is None:
+            raise SensirionException("Metrics not enabled")
+        return self.metrics.to_prometheus(prefix, {"port": self.port})
+
     def _verify(self, recv):
         """
-            Uses the last 2 bytes of the data packet from the Honeywell sensor
+            Uses the checksum byte of the data packet from the Sensirion sensor
             to verify that the data recived is correct
         """
-        calc = self._calculate_checksum(
-            bytes([recv[1]]) +  bytes([recv[2]]) + bytes([recv[3]]) + bytes([recv[4]]),
-            recv[5:-2])
-        self.logger.debug(type(calc))
-        sent = recv[-2]
-        self.logger.debug(type(bytes([sent])))
-        if bytes([sent]) != calc:
-            self.logger.error("Checksum failure 0x%02x != 0x%02x", sent, calc)
-            raise SensirionException("Checksum failure")
+        metrics = self.metrics
+        if metrics is None:
+            shdlc.verify_checksum(recv, self.logger)
+            return
+        start = perf_counter()
+        try:
+            shdlc.verify_checksum(recv, self.logger)
+        except SensirionException as exp:
+            metrics.count_exception(exp)
+            raise
+        finally:
+            metrics.observe("checksum", perf_counter() - start)
 
     def start_measurement(self):
         """
             Send the command to start the sensor reading data
         """
         self._tx(
-            CMD_ADDR, CMD_START_MEASUREMENT,
-            SUBCMD_START_MEASUREMENT_1 + SUBCMD_START_MEASUREMENT_2)
-        sleep(RX_DELAY_S)
-        self._rx(
-            CMD_ADDR, CMD_START_MEASUREMENT,
-            SUBCMD_START_MEASUREMENT_1 + SUBCMD_START_MEASUREMENT_2)
+            CMD_ADDR, CMD_START_MEASUREMENT, SUBCMD_START_MEASUREMENT_1 + self.output_format)
+        self._rx(CMD_ADDR, CMD_START_MEASUREMENT)
         self.measurement_running = True
         self.last_measurement = datetime.utcnow()
 
@@ -166,7 +336,6 @@ class Sensirion(object):
             Send the command to stop the sensor reading data
         """
         self._tx(CMD_ADDR, CMD_STOP_MEASUREMENT)
-        sleep(RX_DELAY_S)
         self._rx(CMD_ADDR, CMD_STOP_MEASUREMENT)
         self.measurement_running = False
 
@@ -175,120 +344,115 @@ class Sensirion(object):
             Send the reset command to the device
         """
         self._tx(CMD_ADDR, CMD_RESET)
-        sleep(RX_DELAY_S)
         self._rx(CMD_ADDR, CMD_RESET)
         self.measurement_running = False
+        self.invalidate_cache()
+        sleep(RESET_DELAY_S)
 
     def start_fan_clean(self):
         """
             Start a manual clean of the fan, takes 10s
         """
         self._tx(CMD_ADDR, CMD_START_FAN_CLEANING)
-        sleep(RX_DELAY_S)
         self._rx(CMD_ADDR, CMD_START_FAN_CLEANING)
 
     def _rx(self, addr, cmd, perform_flush=True):
         """
             Recieve and process a message from the sensor
         """
-        recv = b''
-        start = datetime.utcnow() #Start timer
-        if perform_flush:
-            self.serial.flush() #Flush any data in the buffer
-        while(
-                datetime.utcnow() <
-                (start + timedelta(seconds=self.read_timeout))):
-            inp = self.serial.read() # Read a character from the input
-            if inp == MSG_START_STOP: # check it matches
-                recv += inp # if it does add it to recieve string
-                self.logger.debug(
-                    "Message : 0x%02x --------", int.from_bytes(recv, byteorder="big"))
-                inp = self.serial.read() # read the next character
-                self.logger.debug("Addr byte 0x%02x", ord(inp))
-                if inp == addr:
-                    recv += inp
-                    self.logger.debug(
-                        "Message : 0x%02x --------", int.from_bytes(recv, byteorder="big"))
-                    inp = self.serial.read()
-                    self.logger.debug("Cmd byte : 0x%02x --------", ord(inp))
-                    if inp == cmd:
-                        recv += inp
-                        self.logger.debug(
-                            "Message : 0x%02x --------", int.from_bytes(recv, byteorder="big"))
-                        inp = self.serial.read()
-                        self.logger.debug("Error state byte : 0x%02x --------", ord(inp))
-                        if inp != ERROR_CODE_NO_ERROR:
-                            self.logger.error("State error : 0x%02x --------", ord(inp))
-                            error_str = lookup_error_code(inp)
-                            self.logger.error(error_str)
-                            while inp != MSG_START_STOP: #empty the cache of the sensor
-                                inp = self.serial.read()
-                            raise SensirionException(error_str)
-                        else:
-                            recv += inp
-                            self.logger.debug(
-                                "Message : 0x%02x --------",
-                                int.from_bytes(recv, byteorder="big"))
-                            inp = self.serial.read()
-                            while inp != MSG_START_STOP: #read remaining data until the end byte
-                                recv += inp
-                                self.logger.debug(
-                                    "Message : 0x%02x --------",
-                                    int.from_bytes(recv, byteorder="big"))
-                                inp = self.serial.read()
-                                self.logger.debug("Bytes : 0x%02x --------", ord(inp))
-                            recv += inp
-                            self.logger.debug(
-                                "Message received : 0x%02x --------",
-                                int.from_bytes(recv, byteorder="big"))
-
-                            return recv
-                    else:
-                        self.logger.error(
-                            "Wrong command received 0x%02x, was expecting 0x%02x",
-                            ord(inp), ord(cmd))
-                        self.logger.debug(
-                            "Message received 0x%02x", int.from_bytes(recv, byteorder="big"))
-                        raise SensirionException("Wrong command")
-                else:
-                    self.logger.error(
-                        "Wrong address received 0x%02x, was expecting 0x%02x",
-                        ord(inp), ord(addr))
-                    self.logger.debug(
-                        "Message received 0x%02x",
-                        int.from_bytes(recv, byteorder="big"))
-                    raise SensirionException("Wrong address")
-
-        raise SensirionException("Message incomplete")
-
+        timeout = response_timeout(cmd, self.read_timeout)
+        try:
+            if perform_flush:
+                self.serial.flush() #Flush any data in the buffer
+            if self.serial.timeout != timeout:
+                self.serial.timeout = timeout # Return as soon as the first byte arrives
+        except OSError as exp: # SerialException is an OSError
+            self.logger.error(str(exp))
+            raise SensirionConnectionException(str(exp))
+        metrics = self.metrics
+        if metrics is None:
+            frame = self._reader.read_frame(self.serial, timeout)
+            if self.frame_trace is not None:
+                self.frame_trace(TRACE_RX, frame)
+            return shdlc.decode_response(frame, addr, cmd, self.logger)
+        try:
+            start = perf_counter()
+            frame = self._reader.read_frame(self.serial, timeout)
+            unstuff_start = perf_counter()
+            metrics.observe("rx", unstuff_start - start)
+            if self.frame_trace is not None:
+                self.frame_trace(TRACE_RX, frame)
+            metrics.increment("bytes_in", len(frame))
+            recv = self._unstuff_bytes(frame)
+            checksum_start = perf_counter()
+            metrics.observe("unstuff", checksum_start - unstuff_start)
+            shdlc.check_length(recv, self.logger)
+            shdlc.verify_checksum(recv, self.logger)
+            metrics.observe("checksum", perf_counter() - checksum_start)
+            return shdlc.check_header(recv, addr, cmd, self.logger)
+        except SensirionException as exp:
+            metrics.count_exception(exp)
+            raise
 
     def get_product_name(self):
         """
             Get the product name string
             In the docs this decodes to "Hello World!"
         """
-        return self._device_info(SUBCMD_DEVICE_NAME).decode().rstrip('\0')
+        return self._cached("product_name", lambda: self._device_string(SUBCMD_DEVICE_NAME))
 
     def get_article_code(self):
         """
             Get the article Code
             In the docs this decodes to "x-xxxxxx-xx"
         """
-        return self._device_info(SUBCMD_ARTICLE_CODE).decode().rstrip('\0')
+        return self._cached("article_code", lambda: self._device_string(SUBCMD_ARTICLE_CODE))
 
     def get_serial_no(self):
         """
             Get the serial number
             In the docs this decodes to "00000000000000000000"
         """
-        return self._device_info(SUBCMD_SERIAL_NO).decode().rstrip('\0')
+        serial_no = self._info.get("serial_no")
+        if serial_no is None:
+            serial_no = self._info["serial_no"] = self._device_string(SUBCMD_SERIAL_NO)
+        return serial_no
+
+    def invalidate_cache(self):
+        """
+            Forget the device information so it is read from the sensor again
+        """
+        self._info.clear()
+
+    def _cached(self, key, fetch):
+        """
+            Value from the in-memory cache, the persistent cache or the sensor
+        """
+        value = self._info.get(key)
+        if value is not None:
+            return value
+        if self.info_cache is None:
+            value = fetch()
+        else:
+            serial_no = self.get_serial_no()
+            value = self.info_cache.get(self.port, serial_no, key)
+            if value is None:
+                value = fetch()
+                self.info_cache.set(self.port, serial_no, key, value)
+        self._info[key] = value
+        return value
+
+    def _device_string(self, subcmd):
+        """
+            Get a device information string from the sensor
+        """
+        return self._device_info(subcmd).decode().rstrip('\0')
 
     def _device_info(self, subcmd):
         """
             Get information from the device
         """
         self._tx(CMD_ADDR, CMD_DEVICE_INFORMATION, subcmd)
-        sleep(RX_DELAY_S)
         return self._rx(CMD_ADDR, CMD_DEVICE_INFORMATION, subcmd)[5:-2]
 
     def _check_length(self, data):
@@ -296,13 +460,23 @@ class Sensirion(object):
             Verify that the length of the data unstuffed
             corresponds to the length sent by the sensor
         """
-        data_length = data[4]
-        if data_length == len(data[5:-2]):
-            return True
-        else:
-            self.logger.error(
-                "Wrong data length %d, was expecting %d", len(data[5:-2]), data_length)
-            raise SensirionException("Wrong data length")
+        try:
+            return shdlc.check_length(data, self.logger)
+        except SensirionException as exp:
+            if self.metrics is not None:
+                self.metrics.count_exception(exp)
+            raise
+
+    def _check_measurement_length(self, data):
+        """
+            Verify that a measurement has the size of the active output format
+        """
+        try:
+            check_measurement_length(data, self.output_format, self.logger)
+        except SensirionException as exp:
+            if self.metrics is not None:
+                self.metrics.count_exception(exp)
+            raise
 
     def read(self):
         """
@@ -314,6 +488,25 @@ class Sensirion(object):
         """
             Read a measurement from the device
         """
+        self._wait_for_sample()
+        return self._read_with_retries()
+
+    def read_raw(self):
+        """
+            Read a measurement without decoding it, for consumers that only
+            forward the data
+            Returns (payload, epoch): the validated data bytes as a memoryview
+            (see SensirionReading.from_payload, with the sensor's output_format)
+            and the time it was read
+        """
+        self._wait_for_sample()
+        recv = self._read_frame_with_retries()
+        return memoryview(recv)[MEASUREMENT_OFFSET:-2], time()
+
+    def _wait_for_sample(self):
+        """
+            Start measuring if needed and wait for a new sample to be ready
+        """
         if not self.measurement_running:
             self.logger.warning("Measurement not running, starting measurement")
             self.start_measurement()
@@ -323,35 +516,87 @@ class Sensirion(object):
             self.logger.warning("Trying to read too frequently - forcing delay")
             sleep(MIN_SAMPLE_INTERVAL - time_diff.total_seconds())
             self.logger.debug("Sleep complete, now reading")
-        count = 1
-        while count <= self.retries:
+
+    def stream(self, interval=MIN_SAMPLE_INTERVAL):
+        """
+            Generator yielding a reading on every tick of a fixed schedule,
+            interval seconds apart and timed against the monotonic clock so
+            the sample period doesn't drift.
+            None is yielded for every tick that was missed (because the
+            consumer or the sensor was too slow) or whose read failed, so
+            the output always stays aligned with the schedule.
+        """
+        if interval < MIN_SAMPLE_INTERVAL:
+            raise SensirionException("Interval shorter than %ss" % MIN_SAMPLE_INTERVAL)
+        if not self.measurement_running:
+            self.start_measurement()
+        next_tick = monotonic() + interval # First reading is ready a tick after starting
+        while True:
+            now = monotonic()
+            if now < next_tick:
+                sleep(next_tick - now)
+            elif now - next_tick >= interval:
+                missed = int((now - next_tick) // interval)
+                self.logger.warning("Skipped %d ticks", missed)
+                self.skipped_ticks += missed
+                next_tick += missed * interval
+                for _ in range(missed):
+                    yield None
+            try:
+                reading = self._read_with_retries()
+            except SensirionException:
+                reading = None
+            next_tick += interval
+            yield reading
+
+    def _read_with_retries(self):
+        """
+            Request a measurement and decode it
+        """
+        recv = self._read_frame_with_retries()
+        if self.metrics is None:
+            return SensirionReading(recv, None, self.output_format)
+        start = perf_counter()
+        reading = SensirionReading(recv, None, self.output_format)
+        self.metrics.observe("decode", perf_counter() - start)
+        return reading
+
+    def _read_frame_with_retries(self):
+        """
+            Request a measurement, retrying as the retry policy says until
+            the read deadline
+            Returns the validated unstuffed frame
+        """
+        budget = RetryBudget(self.retry_policy, self.read_deadline, self.logger)
+        while True:
             try:
                 self._tx(CMD_ADDR, CMD_READ_MEASUREMENT)
-                sleep(RX_DELAY_S)
-                recv = self._rx(CMD_ADDR, CMD_READ_MEASUREMENT)
-                recv_unstuffed = self._unstuff_bytes(recv)
-                self._check_length(recv_unstuffed)
-                self._verify(recv_unstuffed) # verify the checksum
-                self.logger.debug(
-                    "Verified message : 0x%02x --------",
-                    int.from_bytes(recv_unstuffed, byteorder="big"))
-                self.logger.debug(type(recv_unstuffed))
+                recv_unstuffed = self._rx(CMD_ADDR, CMD_READ_MEASUREMENT) # Length and checksum verified
+                self._check_measurement_length(recv_unstuffed)
                 self.last_measurement = datetime.utcnow()
-                return SensirionReading(recv_unstuffed)
+                return recv_unstuffed
             except SensirionException as exp:
-                self.logger.warning("Attempt %d/%d failed", count, self.retries)
-                self.logger.error(str(exp))
-                if count == self.retries:
-                    raise exp
-                count += 1 # increment counter
-                sleep(RETRY_SLEEP)
+                delay = budget.delay(exp)
+                if delay is None:
+                    raise
+                if isinstance(exp, SensirionFrameException):
+                    self._reader.reset() # Resync on the next frame
+                if self.metrics is not None:
+                    self.metrics.increment("retries")
+                if delay:
+                    sleep(delay)
 
     def read_cleaning_interval(self):
         """
             Read the cleaning interval from the sensor
         """
+        return self._cached("cleaning_interval", self._read_cleaning_interval)
+
+    def _read_cleaning_interval(self):
+        """
+            Read the cleaning interval from the sensor, bypassing the cache
+        """
         self._tx(CMD_ADDR, CMD_READ_WRITE_AUTOCLEAN_INTERVAL, SUBCMD_READ_INTERVAL)
-        sleep(RX_DELAY_S)
         return int.from_bytes(
             self._rx(CMD_ADDR, CMD_READ_WRITE_AUTOCLEAN_INTERVAL)[5:-2], byteorder='big')
 
@@ -366,17 +611,29 @@ class Sensirion(object):
             self.logger.error("0x%x too large", interval)
             raise SensirionException("Interval too large")
         interval_bytes = int.to_bytes(interval, length=4, byteorder="big")
+        self._forget_cleaning_interval()
         self._tx(
             CMD_ADDR,
             CMD_READ_WRITE_AUTOCLEAN_INTERVAL,
             SUBCMD_READ_INTERVAL + interval_bytes)
-        sleep(RX_DELAY_S)
         self._rx(
             CMD_ADDR,
             CMD_READ_WRITE_AUTOCLEAN_INTERVAL,
             SUBCMD_READ_INTERVAL)
 
 
+    def _forget_cleaning_interval(self):
+        """
+            Drop the cached cleaning interval after it has been changed
+        """
+        self._info.pop("cleaning_interval", None)
+        if self.info_cache is not None:
+            serial_no = self._info.get("serial_no")
+            if serial_no is None:
+                self.info_cache.invalidate(self.port)
+            else:
+                self.info_cache.invalidate(self.port, serial_no, "cleaning_interval")
+
     def _tx(self, addr, cmd, data=b''):
         """
             Build the message to send to the sensor.
@@ -384,85 +641,36 @@ class Sensirion(object):
             cmd = b'\x01'
             data = [b'\x01',b\'x08',b'\xae', ....]
         """
-        checksum = self._calculate_checksum(
-            addr + cmd + bytes([len(data)]), data) #checksum calculated before byte_stuffing
-        message = MSG_START_STOP
-        message += self._stuff_bytes(addr)
-        message += self._stuff_bytes(cmd)
-        message += self._stuff_bytes(bytes([len(data)])) # Length
-        message += self._stuff_bytes(data)
-        message += self._stuff_bytes(checksum)
-        message += MSG_START_STOP
-        self.logger.debug("Message sent: 0x%02x --------", int.from_bytes(message, byteorder="big"))
-        return self.serial.write(message)
+        message = shdlc.build_frame(addr, cmd, data)
+        if self.frame_trace is not None:
+            self.frame_trace(TRACE_TX, message)
+        try:
+            if self.metrics is None:
+                return self.serial.write(message)
+            start = perf_counter()
+            written = self.serial.write(message)
+        except OSError as exp: # SerialException is an OSError
+            self.logger.error(str(exp))
+            raise SensirionConnectionException(str(exp))
+        self.metrics.observe("tx", perf_counter() - start)
+        self.metrics.increment("bytes_out", len(message))
+        return written
 
     def _stuff_bytes(self, data):
         """
             Covert the data into the stuffed format required for transmission
         """
-        data_stuffed = b''
-        data_len = 0
-        for i in data:
-            self.logger.debug("Bytes : 0x%02x --------", i)
-            if bytes([i]) == b'\x7E':
-                data_stuffed += b'\x7D' + b'\x5E'
-                data_len += 2
-            elif bytes([i]) == b'\x7D':
-                data_stuffed += b'\x7D' + b'\x5D'
-                data_len += 2
-            elif bytes([i]) == b'\x11':
-                data_stuffed += b'\x7D' + b'\x31'
-                data_len += 2
-            elif bytes([i]) == b'\x13':
-                data_stuffed += b'\x7D' + b'\x33'
-                data_len += 2
-            else:
-                data_stuffed += bytes([i])
-                data_len += 1
-        return data_stuffed
+        return byte_stuffing.stuff(data)
 
     def _unstuff_bytes(self, data):
         """
         Reverse the data stuffing used on the serial protocol
         """
-        data_unstuffed = b''
-        i = 0
-        while i < len(data):
-            self.logger.debug("Lenght : %02x --------", len(data))
-            self.logger.debug("i : %02x --------", i)
-            self.logger.debug("Bytes : 0x%02x --------", data[i])
-            if bytes([data[i]]) == b'\x7d':
-                self.logger.debug("Bytes +1 : 0x%02x --------", data[i+1])
-                if bytes([data[i + 1]]) == b'\x5e':
-                    data_unstuffed += b'\x7e'
-                    i += 2
-                elif bytes([data[i + 1]]) == b'\x5d':
-                    data_unstuffed += b'\x7d'
-                    i += 2
-                elif bytes([data[i + 1]]) == b'\x31':
-                    data_unstuffed += b'\x11'
-                    i += 2
-                elif bytes([data[i + 1]]) == b'\x33':
-                    data_unstuffed += b'\x13'
-                    i += 2
-            else:
-                data_unstuffed += bytes([data[i]])
-                i += 1
-        self.logger.debug(
-            "Message unstuffed: 0x%02x --------",
-            int.from_bytes(data_unstuffed, byteorder="big"))
-        return data_unstuffed
+        return byte_stuffing.unstuff(data)
 
 
     def _calculate_checksum(self, header, data):
         """
-            Sum all the bytes between MSG_START_STOP (included) and the Checksum
+            Sum all the bytes between MSG_START_STOP (excluded) and the Checksum
         """
-        self.logger.debug("Type header : %s", type(header))
-        self.logger.debug("Type data : %s", type(data))
-        sum_bytes = bytes([(sum(data) + sum(header))%256])
-        # Take the LSB
-        lsb = (ord(sum_bytes) >> 0)
-        # Invert it to get the checksum
-        self.logger.debug("Checksum : 0x%02x", ord(bytes([255 - lsb])))
-        return bytes([255 - lsb])
+        return shdlc.calculate_checksum(header, data)
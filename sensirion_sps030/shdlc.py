@@ -0,0 +1,218 @@
+"""
+    Buffered SHDLC framing for the Sensirion SPS030 UART interface
+"""
+
+import logging
+from time import monotonic
+
+from .byte_stuffing import stuff, unstuff
+from .sensirion_error_codes import ERROR_CODE_NO_ERROR, lookup_error_code
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionDeviceException, SensirionFrameException,
+    SensirionTimeoutException)
+
+LOGGER = logging.getLogger("SPS030 Interface")
+
+MSG_START_STOP = b'\x7e'
+FRAME_DELIMITER = MSG_START_STOP[0]
+MIN_FRAME_LENGTH = 7 # 0x7E ADDR CMD STATE LEN CHK 0x7E
+MIN_MOSI_FRAME_LENGTH = 6 # 0x7E ADDR CMD LEN CHK 0x7E
+MAX_FRAME_LENGTH = 2 + 2 * (5 + 255) # Every byte between the delimiters stuffed
+
+TRACE_TX = "tx" # Frame trace directions
+TRACE_RX = "rx"
+
+
+def log_frames(logger=None):
+    """
+        Frame trace hook logging every frame in hex at debug level
+    """
+    logger = logger or LOGGER
+
+    def trace(direction, frame):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Message %s : %s", direction, frame.hex())
+    return trace
+
+
+class FrameReader(object):
+    """
+        Splits the byte stream coming from the sensor into complete frames.
+        Bytes are accumulated in a reusable buffer and frames are cut on the
+        0x7E delimiter, any garbage in between frames is discarded.
+        Responses from the sensor (MISO) are expected unless min_length says
+        otherwise.
+    """
+    def __init__(self, logger=None, min_length=MIN_FRAME_LENGTH):
+        self.logger = logger or LOGGER
+        self.min_length = min_length
+        self._buffer = bytearray()
+
+    def reset(self):
+        """
+            Discard any partially received data
+        """
+        del self._buffer[:]
+
+    def feed(self, data):
+        """
+            Add bytes received from the sensor to the buffer
+        """
+        self._buffer += data
+
+    def next_frame(self):
+        """
+            Return the next complete frame in the buffer (still stuffed and
+            including both delimiters) or None if there isn't one yet
+        """
+        buf = self._buffer
+        while True:
+            start = buf.find(FRAME_DELIMITER)
+            if start < 0:
+                self._discard(len(buf))
+                return None
+            if start:
+                self._discard(start)
+            end = buf.find(FRAME_DELIMITER, 1)
+            if end < 0:
+                if len(buf) > MAX_FRAME_LENGTH:
+                    # No end in sight, the start byte can't be genuine
+                    self._discard(1)
+                    continue
+                return None
+            if end + 1 < self.min_length:
+                # Either an empty frame or the tail of a frame that started
+                # before we were listening, the closing delimiter may well be
+                # the start of the next frame so keep it.
+                self._discard(end)
+                continue
+            frame = bytes(buf[:end + 1])
+            del buf[:end + 1]
+            return frame
+
+    def read_frame(self, serial, timeout):
+        """
+            Read from the serial port until a complete frame is available
+            Reads whatever is waiting in the port rather than a byte at a time
+        """
+        frame = self.next_frame()
+        deadline = monotonic() + timeout
+        while frame is None:
+            if monotonic() >= deadline:
+                self.reset()
+                raise SensirionTimeoutException("Message incomplete")
+            try:
+                data = serial.read(serial.in_waiting or 1)
+            except OSError as exp: # SerialException is an OSError
+                self.reset()
+                raise SensirionConnectionException(str(exp))
+            if data:
+                self.feed(data)
+                frame = self.next_frame()
+        return frame
+
+    def _discard(self, count):
+        """
+            Drop bytes from the front of the buffer
+        """
+        if not count:
+            return
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Discarding bytes : %s", bytes(self._buffer[:count]).hex())
+        del self._buffer[:count]
+
+
+def calculate_checksum(header, data):
+    """
+        Sum all the bytes between MSG_START_STOP (excluded) and the Checksum,
+        take the LSB and invert it
+    """
+    return bytes([255 - ((sum(header) + sum(data)) & 0xFF)])
+
+
+def build_frame(addr, cmd, data=b''):
+    """
+        Build the stuffed MOSI frame for a command
+    """
+    header = addr + cmd + bytes([len(data)])
+    return (
+        MSG_START_STOP +
+        stuff(header + data + calculate_checksum(header, data)) +
+        MSG_START_STOP)
+
+
+def build_response(addr, cmd, state, data=b''):
+    """
+        Build the stuffed MISO frame the sensor sends in answer to a command
+    """
+    header = addr + cmd + state + bytes([len(data)])
+    return (
+        MSG_START_STOP +
+        stuff(header + data + calculate_checksum(header, data)) +
+        MSG_START_STOP)
+
+
+def decode_response(frame, addr, cmd, logger=LOGGER):
+    """
+        Unstuff a MISO frame and check it answers the expected command
+        Raises SensirionDeviceException if the sensor reported an error
+    """
+    return check_response(unstuff(frame), addr, cmd, logger)
+
+
+def check_response(recv, addr, cmd, logger=LOGGER):
+    """
+        Check an unstuffed MISO frame is intact and answers the expected
+        command. The length and checksum are verified first so that a
+        corrupted header is reported as a SensirionFrameException rather
+        than misread as an error from the sensor.
+    """
+    check_length(recv, logger)
+    verify_checksum(recv, logger)
+    return check_header(recv, addr, cmd, logger)
+
+
+def check_header(recv, addr, cmd, logger=LOGGER):
+    """
+        Check the address, command and state of a verified MISO frame
+    """
+    if recv[1] != addr[0]:
+        logger.error("Wrong address received 0x%02x, was expecting 0x%02x", recv[1], addr[0])
+        raise SensirionFrameException("Wrong address", "wrong_address")
+    if recv[2] != cmd[0]:
+        logger.error("Wrong command received 0x%02x, was expecting 0x%02x", recv[2], cmd[0])
+        raise SensirionFrameException("Wrong command", "wrong_command")
+    state = recv[3:4]
+    if state != ERROR_CODE_NO_ERROR:
+        logger.error("State error : 0x%02x --------", recv[3])
+        error_str = lookup_error_code(state)
+        logger.error(error_str)
+        raise SensirionDeviceException(error_str, state)
+    return recv
+
+
+def check_length(data, logger=LOGGER):
+    """
+        Verify that the length of the data unstuffed
+        corresponds to the length sent by the sensor
+    """
+    if len(data) < MIN_FRAME_LENGTH:
+        logger.error("Frame of %d bytes too short", len(data))
+        raise SensirionFrameException("Frame too short", "length_failures")
+    data_length = data[4]
+    if data_length != len(data) - 7:
+        logger.error("Wrong data length %d, was expecting %d", len(data) - 7, data_length)
+        raise SensirionFrameException("Wrong data length", "length_failures")
+    return True
+
+
+def verify_checksum(data, logger=LOGGER):
+    """
+        Uses the checksum byte of an unstuffed frame to verify
+        that the data received is correct
+    """
+    calc = calculate_checksum(data[1:5], data[5:-2])[0]
+    sent = data[-2]
+    if sent != calc:
+        logger.error("Checksum failure 0x%02x != 0x%02x", sent, calc)
+        raise SensirionFrameException("Checksum failure", "checksum_failures")
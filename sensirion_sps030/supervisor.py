@@ -0,0 +1,153 @@
+"""
+    Supervised connection to a Sensirion SPS030 that survives the USB
+    adapter being reset or unplugged
+"""
+
+import logging
+from time import monotonic
+
+from .sensirion_exception import SensirionConnectionException, SensirionException
+from .sensirion_sps030 import MIN_SAMPLE_INTERVAL, Sensirion
+
+STATE_DISCONNECTED = "disconnected"
+STATE_CONNECTED = "connected"
+
+DEFAULT_MIN_BACKOFF = 1
+DEFAULT_MAX_BACKOFF = 60
+DEFAULT_MAX_FAILURES = 5 # Consecutive failed reads before the port is reopened
+
+
+def find_port(usb_serial_number):
+    """
+        Device name of the USB serial adapter with the given serial number,
+        None if it isn't plugged in
+    """
+    from serial.tools import list_ports # pylint: disable=import-outside-toplevel
+    for port in list_ports.comports():
+        if port.serial_number == usb_serial_number:
+            return port.device
+    return None
+
+
+class SupervisedSensirion(object):
+    """
+        Keeps a Sensirion connected, reopening the port with bounded
+        exponential back-off when it fails.
+        read() never sleeps for the back-off or the first sample after
+        connecting: while the sensor is down or starting it returns None
+        straight away, so a loop polling several sensors keeps going for the
+        others.
+    """
+    def __init__(
+            self, port=None, usb_serial_number=None,
+            min_backoff=DEFAULT_MIN_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+            max_failures=DEFAULT_MAX_FAILURES, **sensor_args):
+        """
+            Either port or the serial number of the USB adapter must be given,
+            the latter follows the adapter if it comes back under a new name.
+            Other arguments are passed on to Sensirion.
+        """
+        if port is None and usb_serial_number is None:
+            raise SensirionException("A port or USB serial number is needed")
+        self.logger = logging.getLogger("SPS030 Interface")
+        self.port = port
+        self.usb_serial_number = usb_serial_number
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.sensor_args = sensor_args
+        self.sensor = None
+        self.state = STATE_DISCONNECTED
+        self.last_error = None
+        self.connects = 0
+        self.failures = 0
+        self._backoff = 0
+        self._next_attempt = 0
+        self._first_sample = 0 # When the first measurement after connecting is ready
+
+    def status(self):
+        """
+            Current state of the connection as a dict
+        """
+        return {
+            "state": self.state,
+            "port": self.port,
+            "usb_serial_number": self.usb_serial_number,
+            "last_error": None if self.last_error is None else str(self.last_error),
+            "connects": self.connects,
+            "consecutive_failures": self.failures,
+            "retry_in": (
+                max(0, self._next_attempt - monotonic())
+                if self.state == STATE_DISCONNECTED else None),
+        }
+
+    def connect(self):
+        """
+            Try to open the sensor (reset and start measuring) unless backing off
+            Returns True if connected
+        """
+        if self.state == STATE_CONNECTED:
+            return True
+        if monotonic() < self._next_attempt:
+            return False
+        try:
+            if self.usb_serial_number is not None:
+                port = find_port(self.usb_serial_number)
+                if port is None:
+                    raise SensirionConnectionException(
+                        "USB serial %s not found" % self.usb_serial_number)
+                self.port = port
+            self.sensor = Sensirion(port=self.port, **self.sensor_args)
+            if not self.sensor.measurement_running:
+                self.sensor.start_measurement()
+        except SensirionException as exp:
+            self._disconnected(exp)
+            return False
+        self.logger.info("%s connected", self.port)
+        self.state = STATE_CONNECTED
+        self.connects += 1
+        self.failures = 0
+        self._backoff = 0
+        self._first_sample = monotonic() + MIN_SAMPLE_INTERVAL
+        return True
+
+    def read(self):
+        """
+            Read a measurement, None if the sensor isn't available right now
+        """
+        if not self.connect():
+            return None
+        if monotonic() < self._first_sample: # Don't wait for it
+            return None
+        try:
+            reading = self.sensor.read_measurement()
+        except SensirionConnectionException as exp:
+            self._disconnected(exp)
+            return None
+        except SensirionException as exp:
+            self.last_error = exp
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self._disconnected(exp)
+            return None
+        self.failures = 0
+        return reading
+
+    def close(self):
+        """
+            Close the port, it will be reopened by the next read()
+        """
+        if self.sensor is not None:
+            self.sensor.close()
+            self.sensor = None
+        self.state = STATE_DISCONNECTED
+
+    def _disconnected(self, exp):
+        """
+            Drop the connection and schedule the next attempt
+        """
+        self.logger.error("%s unavailable: %s", self.port, exp)
+        self.last_error = exp
+        self.close()
+        self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+        self._next_attempt = monotonic() + self._backoff
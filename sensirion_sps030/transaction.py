@@ -0,0 +1,272 @@
+"""
+    Pipelined commands for the Sensirion SPS030
+    Several command frames are written to the port in one go and the
+    responses, which come back in the same order, are matched up with them,
+    saving a round trip per command when bringing a sensor up.
+"""
+
+from collections import deque
+from datetime import datetime
+from time import monotonic, sleep, time
+
+from . import shdlc
+from .sensirion_exception import (
+    SensirionConnectionException, SensirionException, SensirionTimeoutException)
+from .sensirion_sps030 import (
+    CMD_ADDR, CMD_DEVICE_INFORMATION, CMD_READ_MEASUREMENT,
+    CMD_READ_WRITE_AUTOCLEAN_INTERVAL, CMD_RESET, CMD_START_FAN_CLEANING,
+    CMD_START_MEASUREMENT, CMD_STOP_MEASUREMENT, RESET_DELAY_S,
+    SUBCMD_ARTICLE_CODE, SUBCMD_DEVICE_NAME, SUBCMD_READ_INTERVAL,
+    SUBCMD_SERIAL_NO, SUBCMD_START_MEASUREMENT_1, SensirionReading, response_timeout)
+
+
+class PendingResponse(object):
+    """
+        The eventual result of a command queued in a Transaction
+    """
+    __slots__ = ("cmd", "data", "parse", "done", "_value", "_error")
+
+    def __init__(self, cmd, data, parse):
+        self.cmd = cmd
+        self.data = data
+        self.parse = parse
+        self.done = False
+        self._value = None
+        self._error = None
+
+    def set(self, recv):
+        """
+            Store the (unstuffed) response, parsing it if needed
+        """
+        try:
+            self._value = recv if self.parse is None else self.parse(recv)
+        except SensirionException as exp:
+            self._error = exp
+        self.done = True
+
+    def fail(self, exp):
+        """
+            Store the error that prevented a response
+        """
+        self._error = exp
+        self.done = True
+
+    def result(self):
+        """
+            The parsed response, raises the command's SensirionException if it failed
+        """
+        if not self.done:
+            raise SensirionException("Transaction not executed")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def _device_info(recv):
+    """
+        Decode a device information string
+    """
+    return bytes(recv[5:-2]).decode().rstrip('\0')
+
+
+def _cleaning_interval(recv):
+    """
+        Decode the auto-clean interval in seconds
+    """
+    return int.from_bytes(recv[5:-2], byteorder='big')
+
+
+def _measurement(output_format):
+    """
+        Parser checking and decoding a measurement in the given output format
+    """
+    def parse(recv):
+        return SensirionReading(recv, time(), output_format)
+    return parse
+
+
+class Transaction(object):
+    """
+        Queue of commands sent to a Sensirion together
+        Usage:
+            with sensor.transaction() as txn:
+                name = txn.get_product_name()
+                serial_no = txn.get_serial_no()
+            print(name.result(), serial_no.result())
+        A reset can't be pipelined as the sensor restarts, commands queued
+        after it are sent once it has been acknowledged.
+    """
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.queue = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def add(self, cmd, data=b'', parse=None):
+        """
+            Queue a command, parse is applied to the unstuffed response
+        """
+        pending = PendingResponse(cmd, data, parse)
+        self.queue.append(pending)
+        return pending
+
+    def start_measurement(self):
+        """
+            Queue the command to start the sensor reading data
+        """
+        return self.add(
+            CMD_START_MEASUREMENT, SUBCMD_START_MEASUREMENT_1 + self.sensor.output_format)
+
+    def stop_measurement(self):
+        """
+            Queue the command to stop the sensor reading data
+        """
+        return self.add(CMD_STOP_MEASUREMENT)
+
+    def reset(self):
+        """
+            Queue the reset command
+        """
+        return self.add(CMD_RESET)
+
+    def start_fan_clean(self):
+        """
+            Queue a manual clean of the fan
+        """
+        return self.add(CMD_START_FAN_CLEANING)
+
+    def get_product_name(self):
+        """
+            Queue a request for the product name string
+        """
+        return self.add(CMD_DEVICE_INFORMATION, SUBCMD_DEVICE_NAME, _device_info)
+
+    def get_article_code(self):
+        """
+            Queue a request for the article code
+        """
+        return self.add(CMD_DEVICE_INFORMATION, SUBCMD_ARTICLE_CODE, _device_info)
+
+    def get_serial_no(self):
+        """
+            Queue a request for the serial number
+        """
+        return self.add(CMD_DEVICE_INFORMATION, SUBCMD_SERIAL_NO, _device_info)
+
+    def read_cleaning_interval(self):
+        """
+            Queue a request for the cleaning interval
+        """
+        return self.add(
+            CMD_READ_WRITE_AUTOCLEAN_INTERVAL, SUBCMD_READ_INTERVAL, _cleaning_interval)
+
+    def write_cleaning_interval(self, interval):
+        """
+            Queue setting the interval at which the fan should be cleaned
+        """
+        if interval > 0xFFFFFFFF:
+            raise SensirionException("Interval too large")
+        return self.add(
+            CMD_READ_WRITE_AUTOCLEAN_INTERVAL,
+            SUBCMD_READ_INTERVAL + int.to_bytes(interval, length=4, byteorder="big"))
+
+    def read_measurement(self):
+        """
+            Queue reading a measurement, the sample interval is not enforced
+        """
+        return self.add(CMD_READ_MEASUREMENT, parse=_measurement(self.sensor.output_format))
+
+    def execute(self):
+        """
+            Send the queued commands and collect the responses
+            Returns the list of PendingResponse in the order they were queued
+        """
+        queue, self.queue = self.queue, []
+        batch = []
+        for pending in queue:
+            batch.append(pending)
+            if pending.cmd == CMD_RESET:
+                self._run_batch(batch)
+                batch = []
+        if batch:
+            self._run_batch(batch)
+        return queue
+
+    def _run_batch(self, batch):
+        """
+            Write a batch of frames in one call and match up the responses
+        """
+        sensor = self.sensor
+        frames = [shdlc.build_frame(CMD_ADDR, pending.cmd, pending.data) for pending in batch]
+        if sensor.frame_trace is not None:
+            for frame in frames:
+                sensor.frame_trace(shdlc.TRACE_TX, frame)
+        message = b''.join(frames)
+        try:
+            sensor.serial.write(message)
+        except OSError as exp: # SerialException is an OSError
+            sensor.logger.error(str(exp))
+            self._fail_all(batch, SensirionConnectionException(str(exp)))
+            return
+        if sensor.metrics is not None:
+            sensor.metrics.increment("bytes_out", len(message))
+        # The sensor answers one command after another, in the order sent
+        deadline = monotonic() + sum(
+            response_timeout(pending.cmd, sensor.read_timeout) for pending in batch)
+        outstanding = deque(batch)
+        while outstanding:
+            remaining = deadline - monotonic()
+            try:
+                if remaining <= 0:
+                    raise SensirionTimeoutException("Message incomplete")
+                frame = sensor._reader.read_frame(sensor.serial, remaining) # pylint: disable=protected-access
+            except SensirionTimeoutException as exp:
+                self._fail_all(outstanding, exp)
+                return
+            if sensor.frame_trace is not None:
+                sensor.frame_trace(shdlc.TRACE_RX, frame)
+            if sensor.metrics is not None:
+                sensor.metrics.increment("bytes_in", len(frame))
+            pending = outstanding.popleft()
+            try:
+                recv = shdlc.decode_response(frame, CMD_ADDR, pending.cmd, sensor.logger)
+            except SensirionException as exp: # A corrupted answer still answers this command
+                sensor.logger.error(str(exp))
+                if sensor.metrics is not None:
+                    sensor.metrics.count_exception(exp)
+                pending.fail(exp)
+                continue
+            pending.set(recv)
+            self._update_state(pending)
+
+    def _fail_all(self, pendings, exp):
+        """
+            Give every command still waiting the error that stopped the batch
+        """
+        for pending in pendings:
+            pending.fail(exp)
+        if self.sensor.metrics is not None:
+            self.sensor.metrics.count_exception(exp)
+
+    def _update_state(self, pending):
+        """
+            Keep the sensor's view of the measurement state and cache up to date
+        """
+        sensor = self.sensor
+        cmd = pending.cmd
+        if cmd == CMD_START_MEASUREMENT:
+            sensor.measurement_running = True
+            sensor.last_measurement = datetime.utcnow()
+        elif cmd == CMD_STOP_MEASUREMENT:
+            sensor.measurement_running = False
+        elif cmd == CMD_RESET:
+            sensor.measurement_running = False
+            sensor.invalidate_cache()
+            sleep(RESET_DELAY_S)
+        elif cmd == CMD_READ_WRITE_AUTOCLEAN_INTERVAL and len(pending.data) > 1:
+            sensor._forget_cleaning_interval() # pylint: disable=protected-access
@@ -12,12 +12,19 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/FEEprojects/sensirion-sps030",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=("tests", "tests.*")),
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-     python_requires='>=3.3, <4',
-     install_requires=['pyserial','argparse']
+     python_requires='>=3.8, <4',
+     install_requires=['pyserial','argparse'],
+     extras_require={'numpy': ['numpy']},
+     entry_points={
+         'console_scripts': [
+             'sps030=sensirion_sps030.cli:main',
+             'sps030-collector=sensirion_sps030.collector:main',
+         ],
+     }
 )
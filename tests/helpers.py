@@ -0,0 +1,42 @@
+"""
+    Sensors wired to the emulator, shared by the tests
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sensirion_sps030 import Sensirion, SensirionI2C
+from sensirion_sps030.emulator import FakeI2CBus, LoopbackSerial, SPS30Emulator
+from sensirion_sps030.sensirion_sps030 import MEASUREMENT_FIELDS
+
+VALUES = (1.5, 2.5, 3.5, 4.5, 10.0, 11.0, 12.0, 13.0, 14.0, 0.75) # Exact in float32
+
+
+def make_sensor(port=None, **kwargs):
+    """
+        Sensor on a loopback port whose emulator always reports VALUES
+    """
+    port = port or LoopbackSerial(SPS30Emulator(measurement=lambda: VALUES))
+    return Sensirion(serial=port, log_level=logging.CRITICAL, **kwargs)
+
+
+def make_i2c_sensor(bus=None, **kwargs):
+    """
+        Sensor on a fake I2C bus whose emulator always reports VALUES
+    """
+    bus = bus or FakeI2CBus(SPS30Emulator(measurement=lambda: VALUES), sample_interval=0)
+    return SensirionI2C(transport=bus, log_level=logging.CRITICAL, **kwargs)
+
+
+def ready(sensor):
+    """
+        Pretend the last sample was taken long enough ago to read another
+    """
+    sensor.last_measurement = datetime.utcnow() - timedelta(seconds=2)
+
+
+def values(reading):
+    """
+        The ten measurement values of a reading in field order
+    """
+    return tuple(getattr(reading, field) for field in MEASUREMENT_FIELDS)
@@ -0,0 +1,66 @@
+"""
+    AsyncSensirion against the emulator behind a pseudo terminal
+"""
+
+import asyncio
+import logging
+import unittest
+
+from sensirion_sps030 import AsyncSensirion, SensirionConnectionException
+from sensirion_sps030.emulator import PtyEmulator, SPS30Emulator
+from sensirion_sps030.sensirion_sps030 import OUTPUT_FORMAT_INTEGER
+
+from tests.helpers import VALUES, values
+
+
+class TestAsyncSensirion(unittest.TestCase):
+    """
+        Commands awaited on a fresh event loop
+    """
+    def setUp(self):
+        self.emulator = PtyEmulator(SPS30Emulator(
+            product_name="NAME", serial_no="SERIAL", measurement=lambda: VALUES))
+        self.emulator.start()
+
+    def tearDown(self):
+        self.emulator.stop()
+
+    def make_sensor(self, **kwargs):
+        return AsyncSensirion(port=self.emulator.port, log_level=logging.CRITICAL, **kwargs)
+
+    def test_read_measurement(self):
+        async def read():
+            async with self.make_sensor() as sensor:
+                return await sensor.read_measurement()
+        self.assertEqual(values(asyncio.run(read())), VALUES)
+
+    def test_integer_output_format(self):
+        async def read():
+            async with self.make_sensor(output_format=OUTPUT_FORMAT_INTEGER) as sensor:
+                return await sensor.read_measurement()
+        self.assertEqual(asyncio.run(read()).tps, 750)
+
+    def test_concurrent_commands(self):
+        sensor = self.make_sensor() # Created before the loop runs
+        async def query():
+            async with sensor:
+                return await asyncio.gather(
+                    sensor.get_product_name(), sensor.get_serial_no(),
+                    sensor.read_cleaning_interval(), sensor.get_serial_no())
+        self.assertEqual(asyncio.run(query()), ["NAME", "SERIAL", 604800, "SERIAL"])
+
+    def test_cleaning_interval(self):
+        async def write():
+            async with self.make_sensor() as sensor:
+                await sensor.write_cleaning_interval(3600)
+                return await sensor.read_cleaning_interval()
+        self.assertEqual(asyncio.run(write()), 3600)
+
+    def test_open_missing_port(self):
+        sensor = AsyncSensirion(port="/dev/nonexistent-sps030", log_level=logging.CRITICAL)
+        with self.assertRaises(SensirionConnectionException):
+            asyncio.run(sensor.open())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+    Round trip tests of the SHDLC byte stuffing
+"""
+
+import random
+import unittest
+
+from sensirion_sps030.byte_stuffing import STUFF_MAP, stuff, unstuff
+from sensirion_sps030.sensirion_exception import SensirionFrameException
+
+
+class TestByteStuffing(unittest.TestCase):
+    """
+        stuff() and unstuff() against the escapes in the datasheet
+    """
+    def test_reserved_bytes(self):
+        for byte, escaped in STUFF_MAP.items():
+            self.assertEqual(stuff(byte), escaped)
+            self.assertEqual(unstuff(escaped), byte)
+        self.assertEqual(stuff(b'\x7e\x7d\x11\x13'), b'\x7d\x5e\x7d\x5d\x7d\x31\x7d\x33')
+
+    def test_stuffed_has_no_reserved_bytes(self):
+        stuffed = stuff(bytes(range(256)))
+        for byte in (0x7e, 0x11, 0x13):
+            self.assertNotIn(byte, stuffed)
+
+    def test_empty(self):
+        self.assertEqual(stuff(b''), b'')
+        self.assertEqual(unstuff(b''), b'')
+
+    def test_no_escapes_unchanged(self):
+        data = b'\x00\x01\x02\xff'
+        self.assertEqual(stuff(data), data)
+        self.assertEqual(unstuff(data), data)
+
+    def test_random_round_trip(self):
+        rand = random.Random(0)
+        for _ in range(2000):
+            data = bytes(rand.choice(b'\x7e\x7d\x11\x13\x00\xff') if rand.random() < 0.3
+                         else rand.randrange(256) for _ in range(rand.randrange(64)))
+            stuffed = stuff(data)
+            self.assertEqual(unstuff(stuffed), data)
+            self.assertEqual(unstuff(memoryview(bytearray(stuffed))), data)
+            self.assertEqual(stuff(memoryview(data)), stuffed)
+
+    def test_truncated_escape(self):
+        with self.assertRaises(SensirionFrameException) as context:
+            unstuff(b'\x00\x7d')
+        self.assertEqual(context.exception.reason, "escape_failures")
+
+    def test_invalid_escape(self):
+        with self.assertRaises(SensirionFrameException) as context:
+            unstuff(b'\x7d\x00')
+        self.assertEqual(context.exception.reason, "escape_failures")
+
+
+if __name__ == "__main__":
+    unittest.main()
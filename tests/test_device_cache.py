@@ -0,0 +1,105 @@
+"""
+    Device information caching, counted in round trips to the emulator
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sensirion_sps030.emulator import LoopbackSerial, SPS30Emulator
+from sensirion_sps030.shdlc import TRACE_TX
+
+from tests.helpers import make_sensor
+
+
+class RoundTrips(object):
+    """
+        Frame trace hook counting the commands sent
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, direction, frame):
+        if direction == TRACE_TX:
+            self.count += 1
+
+    def since(self, call):
+        """
+            Commands sent while running call()
+        """
+        before = self.count
+        result = call()
+        return result, self.count - before
+
+
+class TestDeviceCache(unittest.TestCase):
+    """
+        What is fetched again after each invalidation
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_sensor(self, serial_no="0123456789ABCDEF", info_cache=None):
+        trips = RoundTrips()
+        emulator = SPS30Emulator(product_name="NAME", serial_no=serial_no)
+        sensor = make_sensor(
+            LoopbackSerial(emulator), frame_trace=trips, info_cache=info_cache)
+        return sensor, emulator, trips
+
+    def test_memory_cache(self):
+        sensor, _, trips = self.make_sensor()
+        self.assertEqual(trips.since(sensor.get_product_name), ("NAME", 1))
+        self.assertEqual(trips.since(sensor.get_product_name), ("NAME", 0))
+        self.assertEqual(trips.since(sensor.get_serial_no)[1], 1)
+        self.assertEqual(trips.since(sensor.get_serial_no)[1], 0)
+
+    def test_reset_invalidates(self):
+        sensor, _, trips = self.make_sensor()
+        sensor.get_product_name()
+        sensor.reset()
+        self.assertEqual(trips.since(sensor.get_product_name), ("NAME", 1))
+
+    def test_close_invalidates(self):
+        sensor, _, _ = self.make_sensor()
+        sensor.get_product_name()
+        sensor.close()
+        self.assertEqual(sensor._info, {}) # pylint: disable=protected-access
+
+    def test_write_cleaning_interval_invalidates(self):
+        sensor, _, trips = self.make_sensor()
+        self.assertEqual(trips.since(sensor.read_cleaning_interval), (604800, 1))
+        self.assertEqual(trips.since(sensor.read_cleaning_interval), (604800, 0))
+        sensor.write_cleaning_interval(3600)
+        self.assertEqual(trips.since(sensor.read_cleaning_interval), (3600, 1))
+
+    def test_persistent_cache(self):
+        sensor, _, trips = self.make_sensor(info_cache=self.path)
+        sensor.get_product_name()
+        sensor.read_cleaning_interval()
+        # A new connection only needs the serial number to find its entry
+        sensor, _, trips = self.make_sensor(info_cache=self.path)
+        self.assertEqual(trips.since(sensor.get_product_name), ("NAME", 1))
+        self.assertEqual(trips.since(sensor.read_cleaning_interval), (604800, 0))
+
+    def test_persistent_cache_keyed_by_serial_no(self):
+        sensor, _, _ = self.make_sensor(info_cache=self.path)
+        sensor.get_product_name()
+        sensor, _, trips = self.make_sensor(serial_no="OTHER", info_cache=self.path)
+        self.assertEqual(trips.since(sensor.get_product_name), ("NAME", 2))
+
+    def test_persistent_cleaning_interval_invalidated(self):
+        sensor, _, _ = self.make_sensor(info_cache=self.path)
+        sensor.read_cleaning_interval()
+        sensor.write_cleaning_interval(3600)
+        # Read from the sensor again, after looking up the serial number
+        sensor, _, trips = self.make_sensor(info_cache=self.path)
+        self.assertEqual(trips.since(sensor.read_cleaning_interval), (604800, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
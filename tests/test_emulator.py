@@ -0,0 +1,158 @@
+"""
+    Sensirion driven against the software SPS30 emulator
+"""
+
+import logging
+import unittest
+from time import monotonic
+
+from sensirion_sps030 import (
+    Sensirion, SensirionDeviceException, SensirionFrameException, SensirionNoDataException,
+    SensirionTimeoutException)
+from sensirion_sps030.emulator import LoopbackSerial, PtyEmulator, SPS30Emulator
+from sensirion_sps030.retry import RetryPolicy
+from sensirion_sps030.sensirion_error_codes import ERROR_CODE_CMD_NOT_ALLOWED, ERROR_CODE_NO_ERROR
+from sensirion_sps030.sensirion_sps030 import CMD_READ_MEASUREMENT
+from sensirion_sps030.shdlc import TRACE_RX, TRACE_TX
+
+from tests.helpers import VALUES, make_sensor, ready, values
+
+
+class TestEmulator(unittest.TestCase):
+    """
+        Commands and error handling over the in-memory loopback
+    """
+    def test_read_measurement(self):
+        sensor = make_sensor()
+        ready(sensor)
+        reading = sensor.read_measurement()
+        self.assertEqual(values(reading), VALUES)
+
+    def test_device_information(self):
+        sensor = make_sensor(LoopbackSerial(SPS30Emulator(
+            product_name="TEST", article_code="12345678", serial_no="ABCDEF")))
+        self.assertEqual(sensor.get_product_name(), "TEST")
+        self.assertEqual(sensor.get_article_code(), "12345678")
+        self.assertEqual(sensor.get_serial_no(), "ABCDEF")
+
+    def test_cleaning_interval(self):
+        emulator = SPS30Emulator()
+        sensor = make_sensor(LoopbackSerial(emulator))
+        self.assertEqual(sensor.read_cleaning_interval(), 604800)
+        sensor.write_cleaning_interval(3600)
+        self.assertEqual(emulator.cleaning_interval, 3600)
+        self.assertEqual(sensor.read_cleaning_interval(), 3600)
+
+    def test_error_code(self):
+        sensor = make_sensor(auto_start=False)
+        with self.assertRaises(SensirionDeviceException) as context:
+            sensor.stop_measurement()
+        self.assertEqual(context.exception.code, ERROR_CODE_CMD_NOT_ALLOWED)
+
+    def test_start_twice_not_allowed(self):
+        sensor = make_sensor()
+        with self.assertRaises(SensirionDeviceException) as context:
+            sensor.start_measurement()
+        self.assertEqual(context.exception.code, ERROR_CODE_CMD_NOT_ALLOWED)
+
+    def test_dropped_frame_times_out(self):
+        port = LoopbackSerial(SPS30Emulator())
+        sensor = make_sensor(port, retry_policy=RetryPolicy())
+        port.faults.drop = 1.0
+        ready(sensor)
+        with self.assertRaises(SensirionTimeoutException):
+            sensor.read_measurement()
+
+    def test_corrupted_frame_rejected(self):
+        port = LoopbackSerial(SPS30Emulator(), seed=1)
+        sensor = make_sensor(port, retry_policy=RetryPolicy())
+        port.faults.corruption = 1.0
+        ready(sensor)
+        with self.assertRaises(SensirionFrameException):
+            sensor.read_measurement()
+
+    def test_empty_measurement_is_no_data(self):
+        emulator = SPS30Emulator()
+        sensor = make_sensor(LoopbackSerial(emulator), retry_policy=RetryPolicy(), metrics=True)
+        emulator.handlers[CMD_READ_MEASUREMENT[0]] = lambda data: (ERROR_CODE_NO_ERROR, b'')
+        ready(sensor)
+        with self.assertRaises(SensirionNoDataException):
+            sensor.read_measurement()
+        self.assertEqual(sensor.snapshot_metrics()["counters"]["empty_measurements"], 1)
+
+    def test_late_sample_waited_for(self):
+        emulator = SPS30Emulator(measurement=lambda: VALUES)
+        sensor = make_sensor(LoopbackSerial(emulator))
+        read_measurement = emulator.handlers[CMD_READ_MEASUREMENT[0]]
+        late_until = monotonic() + 0.05
+        def late(data):
+            if monotonic() < late_until:
+                return ERROR_CODE_NO_ERROR, b''
+            return read_measurement(data)
+        emulator.handlers[CMD_READ_MEASUREMENT[0]] = late
+        ready(sensor)
+        self.assertEqual(values(sensor.read_measurement()), VALUES)
+
+    def test_retries_recover_from_faults(self):
+        port = LoopbackSerial(SPS30Emulator(measurement=lambda: VALUES), seed=3)
+        sensor = make_sensor(port, retries=10, metrics=True)
+        port.faults.corruption = 0.3
+        for _ in range(50):
+            ready(sensor)
+            self.assertEqual(sensor.read_measurement().pm25, VALUES[1])
+        counters = sensor.snapshot_metrics()["counters"]
+        self.assertGreater(counters["checksum_failures"], 0)
+        self.assertEqual(counters["error_responses"], 0)
+
+    def test_corrupted_response_in_transaction(self):
+        port = LoopbackSerial(SPS30Emulator(
+            product_name="NAME", article_code="ARTICLE", serial_no="SERIAL"))
+        sensor = make_sensor(port, auto_start=False)
+        responses = []
+        def corrupt_first(frame):
+            if not responses:
+                frame = frame[:2] + bytes([frame[2] ^ 0x01]) + frame[3:] # Command byte
+            responses.append(frame)
+            return frame
+        port.faults.apply = corrupt_first
+        with sensor.transaction() as txn:
+            name = txn.get_product_name()
+            article = txn.get_article_code()
+            serial_no = txn.get_serial_no()
+        with self.assertRaises(SensirionFrameException):
+            name.result()
+        self.assertEqual(article.result(), "ARTICLE")
+        self.assertEqual(serial_no.result(), "SERIAL")
+
+    def test_transaction_traces_each_frame(self):
+        traced = []
+        sensor = make_sensor(frame_trace=lambda direction, frame: traced.append(direction))
+        del traced[:]
+        with sensor.transaction() as txn:
+            txn.get_serial_no()
+            txn.read_cleaning_interval()
+        self.assertEqual(traced, [TRACE_TX, TRACE_TX, TRACE_RX, TRACE_RX])
+
+    def test_emulator_ignores_bad_checksum(self):
+        emulator = SPS30Emulator()
+        self.assertEqual(emulator.process(b'\x7e\x00\xd3\x00\x00\x7e'), [])
+        self.assertEqual(len(emulator.process(b'\x7e\x00\xd3\x00\x2c\x7e')), 1)
+
+
+class TestPtyEmulator(unittest.TestCase):
+    """
+        The emulator behind a pseudo terminal opened with pyserial
+    """
+    def test_read_over_pty(self):
+        with PtyEmulator(SPS30Emulator(measurement=lambda: VALUES)) as emulator:
+            sensor = Sensirion(port=emulator.port, log_level=logging.CRITICAL)
+            try:
+                ready(sensor)
+                self.assertEqual(sensor.read_measurement().tps, VALUES[-1])
+                self.assertEqual(sensor.get_serial_no(), "0123456789ABCDEF")
+            finally:
+                sensor.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
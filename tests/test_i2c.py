@@ -0,0 +1,112 @@
+"""
+    SensirionI2C against the fake I2C bus
+"""
+
+import logging
+import unittest
+from time import monotonic
+from unittest import mock
+
+from sensirion_sps030 import (
+    SensirionConnectionException, SensirionException, SensirionFrameException, SensirionI2C)
+from sensirion_sps030.emulator import FakeI2CBus, SPS30Emulator
+from sensirion_sps030.i2c import CMD_RESET, add_crcs, check_crcs, crc8
+from sensirion_sps030.sensirion_sps030 import OUTPUT_FORMAT_INTEGER
+
+from tests.helpers import VALUES, make_i2c_sensor, values
+
+
+class TestCrc(unittest.TestCase):
+    """
+        Sensirion CRC-8, polynomial 0x31 and initialisation 0xFF
+    """
+    def test_datasheet_example(self):
+        self.assertEqual(crc8(b'\xbe\xef'), 0x92)
+
+    def test_initialisation(self):
+        self.assertEqual(crc8(b''), 0xFF)
+        self.assertEqual(crc8(b'\x00\x00'), 0x81)
+
+    def test_round_trip(self):
+        data = bytes(range(20))
+        words = add_crcs(data)
+        self.assertEqual(len(words), 30)
+        self.assertEqual(check_crcs(words), data)
+
+    def test_bad_crc(self):
+        words = bytearray(add_crcs(b'\x12\x34\x56\x78'))
+        words[4] ^= 0x01
+        with self.assertRaises(SensirionFrameException) as context:
+            check_crcs(bytes(words))
+        self.assertEqual(context.exception.reason, "checksum_failures")
+
+    def test_incomplete_word(self):
+        with self.assertRaises(SensirionFrameException) as context:
+            check_crcs(b'\x12\x34')
+        self.assertEqual(context.exception.reason, "length_failures")
+
+
+class TestSensirionI2C(unittest.TestCase):
+    """
+        Commands over the fake bus
+    """
+    def test_float_measurement(self):
+        reading = make_i2c_sensor().read_measurement()
+        self.assertEqual(values(reading), VALUES)
+
+    def test_integer_measurement(self):
+        reading = make_i2c_sensor(output_format=OUTPUT_FORMAT_INTEGER).read_measurement()
+        self.assertEqual(
+            values(reading), (2, 2, 4, 4, 10, 11, 12, 13, 14, 750))
+        self.assertEqual(len(reading.payload), 20)
+
+    def test_waits_for_data_ready(self):
+        bus = FakeI2CBus(sample_interval=0.2)
+        sensor = make_i2c_sensor(bus)
+        sensor.read_measurement()
+        self.assertFalse(sensor.read_data_ready())
+        start = monotonic()
+        sensor.read_measurement()
+        self.assertGreaterEqual(monotonic() - start, 0.15)
+
+    def test_corruption_retried(self):
+        bus = FakeI2CBus(SPS30Emulator(measurement=lambda: VALUES), seed=2, sample_interval=0)
+        sensor = make_i2c_sensor(bus, retries=10)
+        bus.corruption = 0.2
+        for _ in range(50):
+            self.assertEqual(sensor.read_measurement().pm10, VALUES[3])
+
+    def test_device_information(self):
+        sensor = make_i2c_sensor(FakeI2CBus(SPS30Emulator(serial_no="ABCDEF")))
+        self.assertEqual(sensor.get_serial_no(), "ABCDEF")
+        self.assertEqual(sensor.get_product_type(), "00080000")
+        self.assertEqual(sensor.get_article_code(), "00080000")
+        self.assertEqual(sensor.get_product_name(), "SPS30")
+
+    def test_unknown_product_type(self):
+        sensor = make_i2c_sensor(FakeI2CBus(SPS30Emulator(article_code="00090000")))
+        with self.assertRaises(SensirionException):
+            sensor.get_product_name()
+
+    def test_cleaning_interval(self):
+        sensor = make_i2c_sensor()
+        self.assertEqual(sensor.read_cleaning_interval(), 604800)
+        sensor.write_cleaning_interval(3600)
+        self.assertEqual(sensor.read_cleaning_interval(), 3600)
+
+    def test_bus_closed_on_failed_bring_up(self):
+        bus = FakeI2CBus()
+        del bus.handlers[CMD_RESET]
+        with mock.patch("sensirion_sps030.i2c.I2CTransport", return_value=bus):
+            with self.assertRaises(SensirionConnectionException):
+                SensirionI2C(log_level=logging.CRITICAL)
+        self.assertFalse(bus.is_open)
+
+    def test_not_acknowledged(self):
+        sensor = make_i2c_sensor()
+        with self.assertRaises(SensirionConnectionException):
+            sensor._write(0x1234) # pylint: disable=protected-access
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+    Retry policies and the retry budget shared by the drivers
+"""
+
+import logging
+import random
+import unittest
+from time import monotonic
+
+from sensirion_sps030 import (
+    SensirionConnectionException, SensirionDeviceException, SensirionException,
+    SensirionFrameException, SensirionNoDataException, SensirionTimeoutException)
+from sensirion_sps030.emulator import LoopbackSerial, SPS30Emulator
+from sensirion_sps030.retry import DefaultRetryPolicy, FixedRetryPolicy, RetryBudget
+
+from tests.helpers import make_sensor, ready
+
+LOGGER = logging.getLogger("SPS030 Interface")
+
+
+class TestDefaultRetryPolicy(unittest.TestCase):
+    """
+        Which failures are retried at once, backed off or given up on
+    """
+    def setUp(self):
+        self.policy = DefaultRetryPolicy(base=0.05, cap=1, rng=random.Random(1))
+
+    def test_frame_errors_retried_at_once(self):
+        exp = SensirionFrameException("Checksum error", "checksum_failures")
+        self.assertEqual(self.policy.delay(exp, 1), 0)
+        self.assertEqual(self.policy.delay(exp, 5), 0)
+
+    def test_timeouts_back_off(self):
+        exp = SensirionTimeoutException("Message incomplete")
+        for attempt in range(1, 10):
+            delay = self.policy.delay(exp, attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(1, 0.05 * 2 ** (attempt - 1)))
+
+    def test_device_and_connection_errors_not_retried(self):
+        self.assertIsNone(self.policy.delay(SensirionDeviceException("Error", b'\x43'), 1))
+        self.assertIsNone(self.policy.delay(SensirionConnectionException("Gone"), 1))
+
+    def test_no_data_polled_until_deadline(self):
+        policy = DefaultRetryPolicy(max_attempts=3, no_data_poll=0.1)
+        exp = SensirionNoDataException("No new measurement")
+        self.assertEqual(policy.delay(exp, 1), 0.1)
+        self.assertEqual(policy.delay(exp, 10), 0.1) # Not limited by max_attempts
+
+    def test_other_errors_wait_base(self):
+        self.assertEqual(self.policy.delay(SensirionException("Other"), 1), 0.05)
+
+    def test_max_attempts(self):
+        policy = DefaultRetryPolicy(max_attempts=3)
+        exp = SensirionFrameException("Checksum error", "checksum_failures")
+        self.assertEqual(policy.delay(exp, 2), 0)
+        self.assertIsNone(policy.delay(exp, 3))
+
+
+class TestFixedRetryPolicy(unittest.TestCase):
+    """
+        The same pause whatever went wrong
+    """
+    def test_fixed(self):
+        policy = FixedRetryPolicy(max_attempts=2, sleep=0.5)
+        self.assertEqual(policy.delay(SensirionTimeoutException("Late"), 1), 0.5)
+        self.assertIsNone(policy.delay(SensirionTimeoutException("Late"), 2))
+        self.assertIsNone(policy.delay(SensirionConnectionException("Gone"), 1))
+
+
+class TestRetryBudget(unittest.TestCase):
+    """
+        Attempts counted and capped by the read deadline
+    """
+    def test_counts_attempts(self):
+        budget = RetryBudget(FixedRetryPolicy(max_attempts=3, sleep=0), 1, LOGGER)
+        exp = SensirionTimeoutException("Late")
+        self.assertEqual(budget.delay(exp), 0)
+        self.assertEqual(budget.delay(exp), 0)
+        self.assertIsNone(budget.delay(exp))
+        self.assertEqual(budget.attempt, 3)
+
+    def test_gives_up_before_passing_deadline(self):
+        budget = RetryBudget(FixedRetryPolicy(max_attempts=10, sleep=0.5), 0.3, LOGGER)
+        self.assertIsNone(budget.delay(SensirionTimeoutException("Late")))
+
+    def test_read_capped_by_deadline(self):
+        port = LoopbackSerial(SPS30Emulator())
+        sensor = make_sensor(
+            port, retry_policy=FixedRetryPolicy(max_attempts=100, sleep=0.05), read_deadline=0.3)
+        port.faults.drop = 1.0
+        ready(sensor)
+        start = monotonic()
+        with self.assertRaises(SensirionTimeoutException):
+            sensor.read_measurement()
+        self.assertLess(monotonic() - start, 0.3 + 0.2) # Deadline plus one response timeout
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+    Writing and reading back ring log files
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sensirion_sps030 import SensirionException, SensirionReading
+from sensirion_sps030.emulator import pack_measurement
+from sensirion_sps030.ring_log import ReadingLog, ReadingRecorder, np
+from sensirion_sps030.sensirion_sps030 import OUTPUT_FORMAT_FLOAT
+
+from tests.helpers import VALUES
+
+
+def reading(epoch):
+    """
+        Reading of VALUES taken at epoch
+    """
+    return SensirionReading.from_payload(
+        pack_measurement(VALUES, OUTPUT_FORMAT_FLOAT), epoch, OUTPUT_FORMAT_FLOAT)
+
+
+class RingLogTestCase(unittest.TestCase):
+    """
+        Log file in a temporary directory
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "sensor.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, epochs, **kwargs):
+        with ReadingRecorder(self.path, **kwargs) as recorder:
+            for epoch in epochs:
+                recorder.append(reading(epoch), b'\x00\x03' if recorder.raw_frames else None)
+
+
+class TestRingLog(RingLogTestCase):
+    """
+        Records survive reopening and wrap around once the ring is full
+    """
+    def test_iterate(self):
+        self.record(range(3), capacity=5)
+        with ReadingLog(self.path) as log:
+            records = list(log)
+        self.assertEqual([epoch for epoch, _, _ in records], [0, 1, 2])
+        self.assertEqual(records[0][1], VALUES)
+        self.assertIsNone(records[0][2])
+
+    def test_wraparound(self):
+        self.record(range(7), capacity=5)
+        with ReadingLog(self.path) as log:
+            self.assertEqual(len(log), 5)
+            self.assertEqual(log.written, 7)
+            self.assertEqual([epoch for epoch, _, _ in log], [2, 3, 4, 5, 6])
+
+    def test_reopen_appends(self):
+        self.record(range(3), capacity=5)
+        self.record(range(3, 6), capacity=5)
+        with ReadingLog(self.path) as log:
+            self.assertEqual([epoch for epoch, _, _ in log], [1, 2, 3, 4, 5])
+
+    def test_raw_frames(self):
+        self.record(range(2), capacity=5, raw_frames=True)
+        with ReadingLog(self.path) as log:
+            self.assertEqual([bytes(raw) for _, _, raw in log], [b'\x00\x03'] * 2)
+
+    def test_reopen_with_other_layout(self):
+        self.record(range(2), capacity=5)
+        with self.assertRaises(SensirionException):
+            ReadingRecorder(self.path, capacity=10)
+        with self.assertRaises(SensirionException):
+            ReadingRecorder(self.path, capacity=5, raw_frames=True)
+
+    def test_frame_too_long(self):
+        with ReadingRecorder(self.path, capacity=5, raw_frames=True) as recorder:
+            with self.assertRaises(SensirionException):
+                recorder.append(reading(0), bytes(64))
+
+
+@unittest.skipIf(np is None, "NumPy not installed")
+class TestRingLogArrays(RingLogTestCase):
+    """
+        NumPy access to the records
+    """
+    def test_views_before_wrap(self):
+        self.record(range(3), capacity=5)
+        with ReadingLog(self.path) as log:
+            older, newer = log.views()
+            self.assertEqual(len(older), 0)
+            self.assertEqual(list(newer["epoch"]), [0, 1, 2])
+            self.assertTrue(np.shares_memory(log.array(), newer)) # Not copied
+
+    def test_views_after_wrap(self):
+        self.record(range(7), capacity=5)
+        with ReadingLog(self.path) as log:
+            older, newer = log.views()
+            self.assertEqual(list(older["epoch"]), [2, 3, 4])
+            self.assertEqual(list(newer["epoch"]), [5, 6])
+            array = log.array()
+        self.assertEqual(list(array["epoch"]), [2, 3, 4, 5, 6])
+        self.assertEqual(float(array["pm25"][0]), VALUES[1])
+
+    def test_views_outlive_close(self):
+        self.record(range(3), capacity=5)
+        log = ReadingLog(self.path)
+        _, newer = log.views()
+        log.close()
+        self.assertEqual(list(newer["epoch"]), [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
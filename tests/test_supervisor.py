@@ -0,0 +1,47 @@
+"""
+    SupervisedSensirion against the emulator behind a pseudo terminal
+"""
+
+import logging
+import unittest
+from time import monotonic, sleep
+
+from sensirion_sps030 import SupervisedSensirion
+from sensirion_sps030.emulator import PtyEmulator, SPS30Emulator
+from sensirion_sps030.sensirion_sps030 import MIN_SAMPLE_INTERVAL
+from sensirion_sps030.supervisor import STATE_CONNECTED, STATE_DISCONNECTED
+
+from tests.helpers import VALUES, values
+
+
+class TestSupervisedSensirion(unittest.TestCase):
+    """
+        Connecting, reading and backing off without blocking the caller
+    """
+    def test_first_read_does_not_wait_for_sample(self):
+        with PtyEmulator(SPS30Emulator(measurement=lambda: VALUES)) as emulator:
+            sensor = SupervisedSensirion(port=emulator.port, log_level=logging.CRITICAL)
+            try:
+                start = monotonic()
+                self.assertIsNone(sensor.read())
+                self.assertLess(monotonic() - start, MIN_SAMPLE_INTERVAL / 2)
+                self.assertEqual(sensor.status()["state"], STATE_CONNECTED)
+                sleep(MIN_SAMPLE_INTERVAL)
+                self.assertEqual(values(sensor.read()), VALUES)
+            finally:
+                sensor.close()
+
+    def test_missing_port_backs_off(self):
+        sensor = SupervisedSensirion(
+            port="/dev/nonexistent-sps030", min_backoff=10, log_level=logging.CRITICAL)
+        self.assertIsNone(sensor.read())
+        status = sensor.status()
+        self.assertEqual(status["state"], STATE_DISCONNECTED)
+        self.assertGreater(status["retry_in"], 5)
+        start = monotonic()
+        self.assertIsNone(sensor.read())
+        self.assertLess(monotonic() - start, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()